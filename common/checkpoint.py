@@ -0,0 +1,34 @@
+"""
+    Q-table checkpoints: <name>.npy holds the Q array (memory-mappable), <name>.json the header -
+    state index layout, training counters and parameters.
+"""
+import json
+
+import numpy as np
+
+
+def paths(path):
+    if path.endswith('.npy') or path.endswith('.json'):
+        path = path.rsplit('.', 1)[0]
+    return path + '.npy', path + '.json'
+
+
+def save(path, array, **header):
+    array_path, header_path = paths(path)
+    np.save(array_path, np.ascontiguousarray(array))
+    header['shape'] = list(np.shape(array))
+    with open(header_path, 'w') as f:
+        json.dump(header, f, indent=2, sort_keys=True)
+
+
+def load(path, mmap=False, program=None):
+    """ Returns (array, header). With mmap=True the array is a read-only memory map """
+    array_path, header_path = paths(path)
+    with open(header_path) as f:
+        header = json.load(f)
+    if program is not None and header.get('program') != program:
+        raise ValueError("%s is a %s checkpoint, not %s" % (path, header.get('program'), program))
+    array = np.load(array_path, mmap_mode='r' if mmap else None)
+    if list(array.shape) != header['shape']:
+        raise ValueError("%s: Q shape %s does not match header %s" % (path, array.shape, header['shape']))
+    return array, header
@@ -0,0 +1,52 @@
+import numpy as np
+
+
+class Convergence:
+    """
+        Early stopping for training loops.
+
+        Tracks |dQ| of every update over a sliding window of `window` steps and, every `check_every`
+        steps, the greedy policy. Training has converged when the window max |dQ| is below `tol`
+        and the greedy policy did not change over `stable_checks` consecutive checks.
+        tol=None or stable_checks=0 disables that criterion.
+
+        The multi agent Q keeps moving by ~alpha per update (ALPHA_DECAY=0.1 leaves alpha near 0.3 after 1M ticks),
+        so there use tol=None and let its greedy path (QLearning.greedy_outcome) decide.
+    """
+
+    def __init__(self, window=1000, tol=1e-3, check_every=1000, stable_checks=3):
+        self.window = window
+        self.tol = tol
+        self.check_every = check_every
+        self.stable_checks = stable_checks
+
+        self.deltas = np.full(window, np.inf)
+        self.count = 0
+        self.policy = None
+        self.stable = 0
+        self.max_delta = np.inf
+        self.reason = None
+
+    def step(self, tick, delta, greedy_policy):
+        """ Records one update, returns True once training should stop """
+        self.deltas[self.count % self.window] = delta
+        self.count += 1
+        if tick % self.check_every:
+            return False
+        return self.check(greedy_policy())
+
+    def check(self, policy):
+        self.max_delta = self.deltas.max()
+        if self.policy is not None and np.array_equal(policy, self.policy):
+            self.stable += 1
+        else:
+            self.stable = 0
+        self.policy = policy
+
+        q_converged = self.tol is None or self.max_delta < self.tol
+        policy_converged = self.stable >= self.stable_checks
+        if q_converged and policy_converged:
+            self.reason = 'converged: max |dQ| %.3g over %d steps, policy stable for %d checks' % (
+                self.max_delta, self.window, self.stable)
+            return True
+        return False
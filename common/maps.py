@@ -0,0 +1,69 @@
+"""
+    Rooms for the grid programs as ROOM-style lists of rows: 0 free, -100 hazard (death), 100 goal.
+
+    load / save read and write .npy files or text, where text is either whitespace separated numbers
+    (also usable for the five_rooms_problem R matrix) or one character per cell from CHARS.
+    generate builds a random room of any size whose start and goal are joined by a hazard-free path.
+"""
+import numpy as np
+
+FREE = 0
+HAZARD = -100
+GOAL = 100
+
+CHARS = {'.': FREE, 'x': HAZARD, 'G': GOAL}
+SYMBOLS = dict((value, char) for char, value in CHARS.items())
+
+
+def load(path):
+    if path.endswith('.npy'):
+        return np.load(path).tolist()
+    with open(path) as f:
+        lines = [line.rstrip('\n') for line in f if line.strip() and not line.startswith('#')]
+    if any(char.isdigit() for char in lines[0]):
+        return [[int(v) for v in line.split()] for line in lines]
+    try:
+        return [[CHARS[char] for char in line.strip()] for line in lines]
+    except KeyError as e:
+        raise ValueError("%s: unknown cell %s, expected one of %s" % (path, e, ''.join(sorted(CHARS))))
+
+
+def save(path, room):
+    if path.endswith('.npy'):
+        np.save(path, np.asarray(room))
+        return
+    with open(path, 'w') as f:
+        for row in room:
+            if all(value in SYMBOLS for value in row):
+                f.write(''.join(SYMBOLS[value] for value in row) + '\n')
+            else:
+                f.write(' '.join('%d' % value for value in row) + '\n')
+
+
+def generate(width, height, hazards=0.2, seed=None, start=None, goal=None, waypoints=None):
+    """
+        Scatters hazards with the given density and carves a safe path from start to goal through random
+        waypoints (one per ~50 cells of width + height by default).
+        start defaults to the bottom-left cell, goal to the bottom-right one, like the built-in ROOM.
+        The cell right of start is kept free too, it is where the second multi_agent agent starts.
+    """
+    rng = np.random.default_rng(seed)
+    start = start or (0, height - 1)
+    goal = goal or (width - 1, height - 1)
+    if waypoints is None:
+        waypoints = max(1, (width + height) // 50)
+
+    room = np.where(rng.random((height, width)) < hazards, HAZARD, FREE)
+
+    points = [start] + [(rng.integers(width), rng.integers(height)) for _ in range(waypoints)] + [goal]
+    for (x1, y1), (x2, y2) in zip(points, points[1:]):
+        # horizontal then vertical leg
+        room[y1, min(x1, x2):max(x1, x2) + 1] = FREE
+        room[min(y1, y2):max(y1, y2) + 1, x2] = FREE
+
+    x, y = start
+    room[y, x] = FREE
+    if x + 1 < width:
+        room[y, x + 1] = FREE
+    room[goal[1], goal[0]] = GOAL
+    return room.tolist()
@@ -0,0 +1,58 @@
+import numpy as np
+
+
+class MaxCache:
+    """
+        Running max, argmax and number of tied maxima per state of a Q array whose last axis is the action.
+        Writes go through write(), which keeps the cache current and rescans a state only
+        when its max entry decreases (or is removed by writing -inf).
+        `state` is an index tuple into Q without the action, e.g. (cell,) or (cell1, cell2).
+    """
+
+    def __init__(self, Q):
+        self.rebuild(Q)
+
+    def rebuild(self, Q):
+        self.Q = Q
+        self.max_q = Q.max(axis=-1)
+        self.argmax = Q.argmax(axis=-1)
+        self.ties = np.count_nonzero(Q == self.max_q[..., None], axis=-1)
+
+    def rescan(self, state):
+        row = self.Q[state]
+        best = row.max()
+        self.max_q[state] = best
+        self.argmax[state] = row.argmax()
+        self.ties[state] = np.count_nonzero(row == best)
+
+    def refresh(self, states):
+        """ Rescans many states at once, `states` is a tuple of index arrays (repeats are fine) """
+        rows = self.Q[states]
+        best = rows.max(axis=-1)
+        self.max_q[states] = best
+        self.argmax[states] = rows.argmax(axis=-1)
+        self.ties[states] = np.count_nonzero(rows == best[..., None], axis=-1)
+
+    def write(self, state, action, value):
+        index = state + (action,)
+        old = self.Q[index]
+        self.Q[index] = value
+        best = self.max_q[state]
+        if value > best:
+            self.max_q[state] = value
+            self.argmax[state] = action
+            self.ties[state] = 1
+        elif value == best:
+            if old != best:
+                self.ties[state] += 1
+                # argmax is the first action at the max, as np.argmax
+                if action < self.argmax[state]:
+                    self.argmax[state] = action
+        elif old == best:
+            self.rescan(state)
+
+    def best_actions(self, state):
+        """ All actions at the max, in action order """
+        if self.ties[state] == 1:
+            return [self.argmax[state]]
+        return np.flatnonzero(self.Q[state] == self.max_q[state])
@@ -0,0 +1,131 @@
+from __future__ import print_function
+import json
+import sys
+import time
+import tracemalloc
+
+
+class Profiler:
+    """
+        Per-phase timing of a training loop, steps/sec over time and allocation counts.
+
+        attach(q_learning) wraps the methods listed in q_learning.PROFILE_PHASES with timers, on the instance
+        only, and detach() puts the originals back, so a QLearning that is not profiled runs untouched code.
+        The training loops call step(tick) when a profiler is attached, which samples steps/sec and the number
+        of allocated memory blocks every `interval` seconds. allocations=True also traces allocations
+        (tracemalloc, slow) for peak memory and the top allocation sites.
+
+        Phase times are inclusive (total) and without nested phases (self), e.g. get_max_q inside get_updated_q.
+    """
+
+    def __init__(self, interval=1.0, allocations=False):
+        self.interval = interval
+        self.allocations = allocations
+
+        self.phases = {}
+        self.stack = []
+        self.timeline = []
+        self.wrapped = []
+        self.tracemalloc = None
+
+        self.started = None
+        self.stopped = None
+        self.last_time = None
+        self.last_tick = 0
+
+    def attach(self, q_learning):
+        for phase, targets in q_learning.PROFILE_PHASES.items():
+            for path, name in targets:
+                target = getattr(q_learning, path) if path else q_learning
+                setattr(target, name, self.timed(phase, getattr(target, name)))
+                self.wrapped.append((target, name))
+        q_learning.profiler = self
+
+        if self.allocations:
+            tracemalloc.start()
+        self.started = self.last_time = time.perf_counter()
+        self.last_tick = getattr(q_learning, 'tick', 0)
+        self.stopped = None
+        self.q_learning = q_learning
+        return self
+
+    def detach(self):
+        self.stopped = time.perf_counter()
+        for target, name in self.wrapped:
+            delattr(target, name)
+        self.wrapped = []
+        self.q_learning.profiler = None
+
+        if self.allocations:
+            snapshot = tracemalloc.take_snapshot()
+            self.tracemalloc = {
+                'peak': tracemalloc.get_traced_memory()[1],
+                'top': [(str(stat.traceback), stat.size, stat.count) for stat in snapshot.statistics('lineno')[:10]],
+            }
+            tracemalloc.stop()
+
+    def timed(self, phase, fn):
+        # [calls, total, nested phases]
+        stats = self.phases.setdefault(phase, [0, 0., 0.])
+        stack = self.stack
+        clock = time.perf_counter
+
+        def wrapped(*args, **kwargs):
+            stack.append(0.)
+            start = clock()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                elapsed = clock() - start
+                stats[0] += 1
+                stats[1] += elapsed
+                stats[2] += stack.pop()
+                if stack:
+                    stack[-1] += elapsed
+
+        return wrapped
+
+    def step(self, tick):
+        now = time.perf_counter()
+        if now - self.last_time >= self.interval:
+            rate = (tick - self.last_tick) / (now - self.last_time)
+            self.timeline.append((now - self.started, tick, rate, sys.getallocatedblocks()))
+            self.last_time = now
+            self.last_tick = tick
+
+    def report(self):
+        wall = (self.stopped or time.perf_counter()) - self.started
+        phases = {}
+        for phase, (calls, total, nested) in self.phases.items():
+            phases[phase] = {
+                'calls': calls,
+                'total': total,
+                'self': total - nested,
+                'mean_us': total / calls * 1e6 if calls else 0.,
+                'share': (total - nested) / wall if wall else 0.,
+            }
+        report = {
+            'wall': wall,
+            'phases': phases,
+            'other': wall - sum(p['self'] for p in phases.values()),
+            'timeline': [dict(zip(('time', 'tick', 'steps_per_sec', 'allocated_blocks'), row))
+                         for row in self.timeline],
+        }
+        if self.tracemalloc is not None:
+            report['allocations'] = self.tracemalloc
+        return report
+
+    def save(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.report(), f, indent=2, sort_keys=True)
+
+    def show(self):
+        report = self.report()
+        print("%-20s %10s %10s %10s %10s %7s" % ('phase', 'calls', 'total s', 'self s', 'mean us', 'share'))
+        for phase, p in sorted(report['phases'].items(), key=lambda item: -item[1]['self']):
+            print("%-20s %10d %10.3f %10.3f %10.2f %6.1f%%" %
+                  (phase, p['calls'], p['total'], p['self'], p['mean_us'], p['share'] * 100))
+        print("%-20s %10s %10s %10.3f" % ('other', '', '', report['other']))
+        for row in report['timeline']:
+            print("%8.1fs  tick %-10d %10.0f steps/sec  %d blocks" %
+                  (row['time'], row['tick'], row['steps_per_sec'], row['allocated_blocks']))
@@ -0,0 +1,26 @@
+import time
+
+
+class Progress:
+    """
+        Decides when a training loop reports its statistics.
+        every - report each N ticks, interval - report at most once per N seconds.
+        With neither set it reports on every tick.
+    """
+
+    def __init__(self, every=None, interval=None):
+        self.every = every
+        self.interval = interval
+        self.last = 0.
+
+    def ready(self, tick):
+        if self.every is None and self.interval is None:
+            return True
+        if self.every is not None and tick % self.every == 0:
+            return True
+        if self.interval is not None:
+            now = time.time()
+            if now - self.last >= self.interval:
+                self.last = now
+                return True
+        return False
@@ -0,0 +1,65 @@
+import numpy as np
+
+
+class ReplayBuffer:
+    """
+        Fixed-capacity ring buffer of transitions (s, a, r, s', done) in preallocated arrays.
+        States are integer ids, `state_width` of them per state (1 for a cell, 2 for a joint cell pair).
+
+        sample() draws a minibatch uniformly, or proportionally to priority ** alpha when prioritized.
+        New transitions get the largest priority seen so far (max_priority, kept by update_priorities);
+        update_priorities sets |dQ| + eps of the replayed ones. Uniform buffers keep no priorities.
+    """
+
+    def __init__(self, capacity=10000, batch_size=32, state_width=1, prioritized=False, alpha=0.6,
+                 eps=1e-3, seed=None):
+        self.capacity = capacity
+        self.batch_size = batch_size
+        self.prioritized = prioritized
+        self.alpha = alpha
+        self.eps = eps
+        self.rng = np.random.default_rng(seed)
+
+        self.states = np.zeros((capacity, state_width), dtype=np.int64)
+        self.actions = np.zeros(capacity, dtype=np.int64)
+        self.rewards = np.zeros(capacity)
+        self.next_states = np.zeros((capacity, state_width), dtype=np.int64)
+        self.done = np.zeros(capacity, dtype=bool)
+        self.priorities = np.zeros(capacity)
+        self.max_priority = 1.
+
+        self.count = 0
+
+    def __len__(self):
+        return min(self.count, self.capacity)
+
+    def add(self, state, action, reward, next_state, done):
+        i = self.count % self.capacity
+        self.states[i] = state
+        self.actions[i] = action
+        self.rewards[i] = reward
+        self.next_states[i] = next_state
+        self.done[i] = done
+        if self.prioritized:
+            self.priorities[i] = self.max_priority
+        self.count += 1
+
+    def ready(self):
+        return len(self) >= self.batch_size
+
+    def sample(self):
+        """ Returns (indexes, states, actions, rewards, next_states, done); states as tuples of id arrays """
+        size = len(self)
+        if self.prioritized:
+            p = self.priorities[:size] ** self.alpha
+            idx = self.rng.choice(size, self.batch_size, p=p / p.sum())
+        else:
+            idx = self.rng.integers(0, size, self.batch_size)
+        return (idx, tuple(self.states[idx].T), self.actions[idx], self.rewards[idx],
+                tuple(self.next_states[idx].T), self.done[idx])
+
+    def update_priorities(self, idx, deltas):
+        if self.prioritized:
+            priorities = np.abs(deltas) + self.eps
+            self.priorities[idx] = priorities
+            self.max_priority = max(self.max_priority, float(priorities.max()))
@@ -0,0 +1,100 @@
+import os
+
+import numpy as np
+
+
+class Statistics:
+    """
+        Constant-memory training statistics.
+
+        Keeps the last `capacity` samples in a preallocated ring buffer and a mean of every column
+        per `window` samples (also a bounded ring). Window means are streamed to `path` as CSV when given;
+        the file is reopened for appending by the next window after close().
+    """
+
+    def __init__(self, columns, capacity=10000, window=100, path=None):
+        self.columns = tuple(columns)
+        self.capacity = capacity
+        self.window = window
+
+        self.samples = np.zeros((capacity, len(self.columns)))
+        self.count = 0
+        self.pending = []
+        self.sums = np.zeros(len(self.columns))
+
+        # first column is the tick the window ended on
+        self.means = np.zeros((capacity, len(self.columns) + 1))
+        self.windows_count = 0
+
+        self.path = path
+        self.file = None
+        if path:
+            self.open()
+
+    def open(self):
+        new_file = not os.path.exists(self.path) or os.path.getsize(self.path) == 0
+        self.file = open(self.path, 'a')
+        if new_file:
+            self.file.write(','.join(('tick',) + self.columns) + '\n')
+
+    def __len__(self):
+        return min(self.count, self.capacity)
+
+    def append(self, tick, *values):
+        # plain tuples per step, folded into the arrays once per window
+        self.pending.append(values)
+        self.count += 1
+        if self.count % self.window == 0:
+            self.fold()
+            self.close_window(tick)
+
+    def fold(self):
+        """ Moves the pending samples into the ring and the window sums """
+        if not self.pending:
+            return
+        block = np.array(self.pending, dtype=float)
+        self.pending = []
+        self.sums += block.sum(axis=0)
+        block = block[-self.capacity:]
+        self.samples[np.arange(self.count - len(block), self.count) % self.capacity] = block
+
+    def close_window(self, tick):
+        row = self.means[self.windows_count % self.capacity]
+        row[0] = tick
+        row[1:] = self.sums / self.window
+        self.sums[:] = 0
+        self.windows_count += 1
+        if self.path:
+            if self.file is None:
+                self.open()
+            self.file.write(','.join(repr(float(v)) for v in row) + '\n')
+
+    @staticmethod
+    def ordered(ring, count, capacity):
+        if count <= capacity:
+            return ring[:count]
+        start = count % capacity
+        return np.concatenate((ring[start:], ring[:start]))
+
+    def last(self):
+        """ Last samples in chronological order, {column: array} """
+        self.fold()
+        data = self.ordered(self.samples, self.count, self.capacity)
+        return dict((name, data[:, i]) for i, name in enumerate(self.columns))
+
+    def windows(self):
+        """ Window means in chronological order, {'tick': array, column: array} """
+        data = self.ordered(self.means, self.windows_count, self.capacity)
+        result = {'tick': data[:, 0]}
+        for i, name in enumerate(self.columns):
+            result[name] = data[:, i + 1]
+        return result
+
+    def flush(self):
+        if self.file is not None:
+            self.file.flush()
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
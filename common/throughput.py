@@ -0,0 +1,17 @@
+class Throughput:
+    """
+        steps_per_second / show_statistics of the batch, parallel and swarm trainers.
+        A trainer counts self.steps and self.elapsed seconds, and names what runs side by side
+        with `lanes` = (label, attribute), e.g. ('Envs', 'n_envs').
+    """
+
+    lanes = ('Envs', 'n_envs')
+
+    @property
+    def steps_per_second(self):
+        return self.steps / self.elapsed if self.elapsed else 0.
+
+    def show_statistics(self):
+        label, attribute = self.lanes
+        print("%s: %d, Steps: %d, %.0f steps/sec" % (label, getattr(self, attribute), self.steps,
+                                                     self.steps_per_second))
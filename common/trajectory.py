@@ -0,0 +1,137 @@
+"""
+    Append-only binary log of training steps, one fixed-size record per agent and step:
+    (episode, step, agent, state, action, reward, q), q being the Q value written by the update.
+
+    File layout: MAGIC, a 4 byte little-endian header length, a JSON header (dtype, program, ...),
+    then the packed records. Records are written in chunks, so memory stays bounded however long the run is,
+    and the reader memory-maps them.
+"""
+import json
+import os
+import struct
+
+import numpy as np
+
+# version 2: action widened from u1, five_rooms_problem logs the next node id as the action
+MAGIC = b'QTRJ2\n'
+
+DTYPE = np.dtype([
+    ('episode', '<u4'),
+    ('step', '<u4'),
+    ('agent', 'u1'),
+    ('state', '<i8'),
+    ('action', '<i8'),
+    ('reward', '<f4'),
+    ('q', '<f4'),
+])
+# DTYPE.descr as it reads back from the JSON header
+DESCR = [list(field) for field in DTYPE.descr]
+
+
+def read_header(f):
+    magic = f.read(len(MAGIC))
+    if magic != MAGIC:
+        if magic.startswith(MAGIC[:4]):
+            raise ValueError("%s is a trajectory log of another version (%r)" % (f.name, magic.strip()))
+        raise ValueError("%s is not a trajectory log" % f.name)
+    size, = struct.unpack('<I', f.read(4))
+    return json.loads(f.read(size).decode('utf-8')), len(MAGIC) + 4 + size
+
+
+class TrajectoryWriter:
+    """
+        Buffers records as tuples and writes every `chunk_size` of them in one go.
+        An existing log is appended to if its header matches (same layout, program, states, ...).
+        Call close() (or use `with`) to write the last chunk.
+    """
+
+    def __init__(self, path, chunk_size=65536, **header):
+        self.path = path
+        self.chunk_size = chunk_size
+        self.buffer = []
+        self.written = 0
+
+        if os.path.exists(path) and os.path.getsize(path) > 0:
+            with open(path, 'rb') as f:
+                existing, offset = read_header(f)
+            if existing['dtype'] != DESCR:
+                raise ValueError("%s has another record layout" % path)
+            # state / action indexes of another program or room would be mixed into the log
+            header = json.loads(json.dumps(header))
+            different = sorted(key for key in header if existing.get(key) != header[key])
+            if different:
+                raise ValueError("%s was recorded with another %s" % (path, ', '.join(different)))
+            self.written = (os.path.getsize(path) - offset) // DTYPE.itemsize
+            self.file = open(path, 'ab')
+        else:
+            self.file = open(path, 'wb')
+            header['dtype'] = DESCR
+            data = json.dumps(header, sort_keys=True).encode('utf-8')
+            self.file.write(MAGIC + struct.pack('<I', len(data)) + data)
+
+    def __len__(self):
+        return self.written + len(self.buffer)
+
+    def append(self, episode, step, state, action, reward, q, agent=0):
+        self.buffer.append((episode, step, agent, state, action, reward, q))
+        if len(self.buffer) >= self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        if self.buffer:
+            self.file.write(np.array(self.buffer, dtype=DTYPE).tobytes())
+            self.written += len(self.buffer)
+            self.buffer = []
+        self.file.flush()
+
+    def close(self):
+        if self.file is not None:
+            self.flush()
+            self.file.close()
+            self.file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class TrajectoryReader:
+    """ Read-only memory map of a log; records is a structured array with the DTYPE fields """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self.header, offset = read_header(f)
+        count = (os.path.getsize(path) - offset) // DTYPE.itemsize
+        if count:
+            self.records = np.memmap(path, dtype=DTYPE, mode='r', offset=offset, shape=(count,))
+        else:
+            self.records = np.zeros(0, dtype=DTYPE)
+
+    def __len__(self):
+        return len(self.records)
+
+    def episodes(self):
+        return np.unique(self.records['episode'])
+
+    def episode(self, episode, agent=None):
+        """ Records of one episode, in step order """
+        records = self.records[self.records['episode'] == episode]
+        if agent is not None:
+            records = records[records['agent'] == agent]
+        return records
+
+    def summary(self):
+        records = self.records
+        episodes, lengths = np.unique(records['episode'], return_counts=True)
+        agents = len(np.unique(records['agent'])) if len(records) else 0
+        return {
+            'records': len(records),
+            'episodes': len(episodes),
+            'agents': agents,
+            'mean_steps': float(lengths.mean()) / max(agents, 1) if len(lengths) else 0.,
+            'mean_reward': float(records['reward'].mean()) if len(records) else 0.,
+            'mean_q': float(records['q'].mean()) if len(records) else 0.,
+        }
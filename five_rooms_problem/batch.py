@@ -0,0 +1,89 @@
+import time
+
+import numpy as np
+
+from common.throughput import Throughput
+from five_rooms_problem.graph import Graph
+
+
+class BatchTrainer(Throughput):
+    """
+        Runs N random-start episodes in lock-step, all updating one Q with the same rule as training,
+        Q(state, action) = R(state, action) + Gamma * Max[Q(next state, all actions)].
+        A dense Q is switched to an np.ndarray, a graph Q is updated in place (per edge).
+        Every step reads max Q as it was before the step, so episodes updating the same entry agree.
+    """
+
+    def __init__(self, q_learning, n_envs=64, seed=None):
+        self.q_learning = q_learning
+        self.n_envs = n_envs
+        self.rng = np.random.default_rng(seed)
+
+        if q_learning.graph is not None:
+            self.graph = q_learning.graph
+            self.Q = None
+        else:
+            self.graph = Graph.from_matrix(q_learning.R)
+            self.Q = np.array(q_learning.Q, dtype=float)
+            q_learning.Q = self.Q
+        self.degree = np.diff(self.graph.indptr)
+        if not self.degree.all():
+            raise ValueError("Node %d has no edges" % np.flatnonzero(self.degree == 0)[0])
+
+        self.max_q = np.array(q_learning.max_q, dtype=float)
+
+        self.steps = 0
+        self.elapsed = 0.
+
+    def read(self, edges):
+        if self.Q is None:
+            return self.q_learning.Q.values[edges]
+        return self.Q[self.graph.sources[edges], self.graph.indices[edges]]
+
+    def write(self, edges, values):
+        if self.Q is None:
+            self.q_learning.Q.values[edges] = values
+        else:
+            self.Q[self.graph.sources[edges], self.graph.indices[edges]] = values
+
+    def rescan(self, states):
+        graph = self.graph
+        for state in np.unique(states):
+            edges = np.arange(graph.indptr[state], graph.indptr[state + 1])
+            self.max_q[state] = max(self.read(edges).max(), 0)
+
+    def training(self):
+        ql = self.q_learning
+        graph = self.graph
+        nodes = len(graph)
+        states = self.rng.integers(0, nodes, self.n_envs)
+        count = 0
+        started = time.time()
+
+        while count < ql.Epochs:
+            # a random allowed action per episode, like choose_next_action
+            edges = graph.indptr[states] + (self.rng.random(self.n_envs) * self.degree[states]).astype(np.int64)
+            actions = graph.indices[edges]
+
+            old = self.read(edges)
+            updated = graph.rewards[edges] + ql.Gamma * self.max_q[actions]
+            self.write(edges, updated)
+
+            # same bookkeeping as set_q: raise the max, rescan when a max entry went down
+            dropped = (updated < old) & (old == self.max_q[states])
+            np.maximum.at(self.max_q, states, updated)
+            if dropped.any():
+                self.rescan(states[dropped])
+
+            done = states == actions
+            finished = int(done.sum())
+            count += finished
+            ql.episodes += finished
+            states = np.where(done, self.rng.integers(0, nodes, self.n_envs), actions)
+
+            ql.tick += self.n_envs
+            self.steps += self.n_envs
+
+        ql.max_q = self.max_q.tolist()
+        ql.stop_reason = 'epochs: %d' % count
+        self.elapsed += time.time() - started
@@ -0,0 +1,135 @@
+import numpy as np
+
+try:
+    xrange
+except NameError:
+    xrange = range
+
+
+class Graph:
+    """
+        Sparse form of the R matrix for large graphs, in CSR layout: the edges leaving node s are
+        indices[indptr[s]:indptr[s + 1]] (sorted by target) and rewards[e] is the reward of edge e.
+        An edge is an allowed action; as in R, the goal is a node with an edge to itself.
+    """
+
+    def __init__(self, indptr, indices, rewards):
+        self.indptr = np.asarray(indptr, dtype=np.int64)
+        self.indices = np.asarray(indices, dtype=np.int64)
+        self.rewards = np.asarray(rewards, dtype=float)
+        # source node of every edge, for per-edge vectorized work
+        self.sources = np.repeat(np.arange(len(self)), np.diff(self.indptr))
+
+    def __len__(self):
+        return len(self.indptr) - 1
+
+    @classmethod
+    def from_edges(cls, sources, targets, rewards, nodes=None):
+        sources = np.asarray(sources, dtype=np.int64)
+        targets = np.asarray(targets, dtype=np.int64)
+        rewards = np.asarray(rewards, dtype=float)
+        if nodes is None:
+            nodes = int(max(sources.max(), targets.max())) + 1 if len(sources) else 0
+        order = np.lexsort((targets, sources))
+        indptr = np.zeros(nodes + 1, dtype=np.int64)
+        np.cumsum(np.bincount(sources, minlength=nodes), out=indptr[1:])
+        return cls(indptr, targets[order], rewards[order])
+
+    @classmethod
+    def from_matrix(cls, R):
+        R = np.asarray(R)
+        sources, targets = np.nonzero(R >= 0)
+        return cls.from_edges(sources, targets, R[sources, targets], len(R))
+
+    @classmethod
+    def load(cls, path):
+        """ .npz written by save(), or a text edge list with one 'source target reward' per line """
+        if path.endswith('.npz'):
+            data = np.load(path)
+            return cls(data['indptr'], data['indices'], data['rewards'])
+        edges = np.loadtxt(path, ndmin=2, comments='#')
+        return cls.from_edges(edges[:, 0].astype(np.int64), edges[:, 1].astype(np.int64), edges[:, 2])
+
+    def save(self, path):
+        np.savez(path, indptr=self.indptr, indices=self.indices, rewards=self.rewards)
+
+    def neighbours(self, node):
+        return self.indices[self.indptr[node]:self.indptr[node + 1]]
+
+    def edge(self, source, target):
+        start, end = self.indptr[source], self.indptr[source + 1]
+        e = start + np.searchsorted(self.indices[start:end], target)
+        if e == end or self.indices[e] != target:
+            raise KeyError((source, target))
+        return e
+
+    def row_max(self, values, initial=0.):
+        """ max(initial, values of the edges leaving each node) for all nodes at once """
+        result = np.full(len(self), float(initial))
+        rows = np.flatnonzero(np.diff(self.indptr))
+        if len(rows):
+            result[rows] = np.maximum(np.maximum.reduceat(values, self.indptr[rows]), initial)
+        return result
+
+    def row_argmax(self, values):
+        """ Target of the first best edge leaving each node, the node itself when it has none """
+        best = self.row_max(values, -np.inf)
+        edges = np.flatnonzero(values == best[self.sources])
+        nodes, first = np.unique(self.sources[edges], return_index=True)
+        result = np.arange(len(self))
+        result[nodes] = self.indices[edges[first]]
+        return result
+
+    def to_matrix(self):
+        R = np.full((len(self), len(self)), -1.)
+        R[self.sources, self.indices] = self.rewards
+        return R
+
+
+class EdgeMatrix:
+    """
+        Per-edge values of a Graph read and written like the dense matrix, m[state][action].
+        Pairs without an edge read as `missing`; iterating a row yields all len(graph) entries.
+    """
+
+    def __init__(self, graph, values, missing=0):
+        self.graph = graph
+        self.values = values
+        self.missing = missing
+
+    def __len__(self):
+        return len(self.graph)
+
+    def __getitem__(self, state):
+        return EdgeRow(self, state)
+
+    def __iter__(self):
+        for state in xrange(len(self.graph)):
+            yield EdgeRow(self, state)
+
+
+class EdgeRow:
+    __slots__ = ('matrix', 'state')
+
+    def __init__(self, matrix, state):
+        self.matrix = matrix
+        self.state = state
+
+    def __len__(self):
+        return len(self.matrix.graph)
+
+    def __getitem__(self, action):
+        try:
+            return self.matrix.values[self.matrix.graph.edge(self.state, action)]
+        except KeyError:
+            return self.matrix.missing
+
+    def __setitem__(self, action, value):
+        self.matrix.values[self.matrix.graph.edge(self.state, action)] = value
+
+    def __iter__(self):
+        graph = self.matrix.graph
+        row = np.full(len(graph), self.matrix.missing, dtype=float)
+        start, end = graph.indptr[self.state], graph.indptr[self.state + 1]
+        row[graph.indices[start:end]] = self.matrix.values[start:end]
+        return iter(row.tolist())
@@ -1,6 +1,19 @@
 #!/usr/bin/env python
 from __future__ import print_function
+import os
 import random
+import sys
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from common import checkpoint, maps
+from common.trajectory import TrajectoryWriter
+from five_rooms_problem.batch import BatchTrainer
+from five_rooms_problem.graph import EdgeMatrix, Graph
 
 try:
     xrange
@@ -8,7 +21,14 @@ except NameError:
     xrange = range
 
 class QLearning():
-    def __init__(self):
+    # methods timed by common.profiler.Profiler, phase -> [(attribute holding the method, '' for self, method)]
+    PROFILE_PHASES = {
+        'choose_next_action': [('', 'choose_next_action')],
+        'get_max_q': [('', 'get_max_q')],
+        'get_updated_q': [('', 'calculate_q')],
+    }
+
+    def __init__(self, rewards=None, graph=None):
 
         # Rewards matrix
         self.R = [[-1, -1, -1, -1, 0, -1],
@@ -17,37 +37,77 @@ class QLearning():
                   [-1, 0, 0, -1, 0, -1],
                   [-1, 0, 0, -1, -1, 100],
                   [-1, 0, -1, -1, 0, 100]]
+        # any other square rewards matrix, e.g. common.maps.load of a text file; Q is an np.ndarray when R is one
+        if rewards is not None:
+            self.R = rewards
 
-        self.Q = [[0, 0, 0, 0, 0, 0],
-                  [0, 0, 0, 0, 0, 0],
-                  [0, 0, 0, 0, 0, 0],
-                  [0, 0, 0, 0, 0, 0],
-                  [0, 0, 0, 0, 0, 0],
-                  [0, 0, 0, 0, 0, 0]]
+        # sparse R for large graphs (five_rooms_problem.graph.Graph), R and Q then only hold the edges
+        self.graph = graph
+        if graph is not None:
+            self.R = EdgeMatrix(graph, graph.rewards, missing=-1)
+            self.Q = EdgeMatrix(graph, np.zeros(len(graph.indices)))
+        elif isinstance(self.R, np.ndarray):
+            self.Q = np.zeros(self.R.shape)
+        else:
+            self.Q = [[0] * len(self.R) for _ in xrange(len(self.R))]
 
         self.MaxStateCount = len(self.Q)
+        # allowed[state] - actions with an edge in R, compiled once (call compile_actions after changing R)
+        self.allowed = []
+        self.compile_actions()
+        # max_q[state] == get_max_q(state), kept current by set_q
+        self.max_q = [0] * self.MaxStateCount
+        self.rebuild_max_q()
         self.Gamma = .5
         self.Epochs = 500
+        self.tick = 0
+        # goals reached over every training call, the episode id of the trajectory log
+        self.episodes = 0
+        # optional common.convergence.Convergence, stops training early
+        self.convergence = None
+        self.stop_reason = None
+        # common.profiler.Profiler while one is attached
+        self.profiler = None
+        # common.trajectory.TrajectoryWriter logging every step, see record()
+        self.recorder = None
+
+    def compile_actions(self):
+        if self.graph is not None:
+            self.allowed = [self.graph.neighbours(state).tolist() for state in xrange(self.MaxStateCount)]
+            return
+        self.allowed = [np.flatnonzero(row >= 0).tolist() for row in np.asarray(self.R)]
 
     def get_allowed_actions(self, state):
-        allowed_actions = []
-        for i in xrange(self.MaxStateCount):
-            if self.R[state][i] >= 0:
-                allowed_actions.append(i)
-        return allowed_actions
+        return self.allowed[state]
 
     def choose_next_action(self, current_state):
         allowed = self.get_allowed_actions(current_state)
         return random.choice(allowed)
 
     def get_max_q(self, next_state):
-        allowed = self.get_allowed_actions(next_state)
+        return self.max_q[next_state]
+
+    def scan_max_q(self, state):
+        allowed = self.get_allowed_actions(state)
         max = 0
         for i in allowed:
-            if self.Q[next_state][i] > max:
-                max = self.Q[next_state][i]
+            if self.Q[state][i] > max:
+                max = self.Q[state][i]
         return max
 
+    def rebuild_max_q(self):
+        for state in xrange(self.MaxStateCount):
+            self.max_q[state] = self.scan_max_q(state)
+
+    def set_q(self, state, action, value):
+        old = self.Q[state][action]
+        self.Q[state][action] = value
+        if value > self.max_q[state]:
+            self.max_q[state] = value
+        elif value < old == self.max_q[state]:
+            # the max entry went down, it may not be the max anymore
+            self.max_q[state] = self.scan_max_q(state)
+
     def calculate_q(self, state, action):
         # Q(state, action) = R(state, action) + Gamma * Max[Q(next state, all actions)]
         return self.R[state][action] + self.Gamma * self.get_max_q(action)
@@ -56,40 +116,152 @@ class QLearning():
         # get random state
         state = self.next_state()
         count = 0
+        step = 0
 
         while count < self.Epochs:
 
             action = self.choose_next_action(state)
 
-            self.Q[state][action] = self.calculate_q(state, action)
+            old_q = self.Q[state][action]
+            self.set_q(state, action, self.calculate_q(state, action))
+            self.tick += 1
+
+            if self.profiler is not None:
+                self.profiler.step(self.tick)
+            if self.recorder is not None:
+                self.recorder.append(self.episodes, step, state, action, self.R[state][action], self.Q[state][action])
+
+            if self.convergence is not None and \
+                    self.convergence.step(self.tick, abs(self.Q[state][action] - old_q), self.greedy_actions):
+                self.stop_reason = self.convergence.reason
+                break
 
             if state == action:
                 # goal completed, start next epoch
                 count += 1
+                self.episodes += 1
+                step = 0
                 state = self.next_state()
             else:
                 state = action
+                step += 1
+        else:
+            self.stop_reason = 'epochs: %d' % count
+
+        if self.recorder is not None:
+            self.recorder.flush()
+
+    def record(self, path, chunk_size=65536):
+        """ Logs every training step to path (common.trajectory), the action is the next state """
+        self.recorder = TrajectoryWriter(path, chunk_size, program='five_rooms_problem', states=self.MaxStateCount)
+        return self.recorder
+
+    def training_batch(self, n_envs=64, seed=None):
+        trainer = BatchTrainer(self, n_envs, seed)
+        trainer.training()
+        return trainer
+
+    def greedy_actions(self):
+        if self.graph is not None:
+            return self.graph.row_argmax(self.Q.values)
+        return np.argmax(np.array(self.Q), axis=1)
+
+    def save(self, path):
+        if self.graph is not None:
+            checkpoint.save(path, self.Q.values,
+                            program='five_rooms_problem', state_index='[edge] in graph CSR order',
+                            tick=self.tick, Gamma=self.Gamma)
+            return
+        checkpoint.save(path, np.array(self.Q, dtype=float),
+                        program='five_rooms_problem', state_index='[state, action]',
+                        tick=self.tick, Gamma=self.Gamma)
+
+    def load(self, path, mmap=False):
+        array, header = checkpoint.load(path, mmap, program='five_rooms_problem')
+        if self.graph is not None:
+            if len(array) != len(self.graph.indices):
+                raise ValueError("%s was trained on %d edges" % (path, len(array)))
+            self.Q.values = array if mmap else np.array(array)
+        else:
+            if len(array) != self.MaxStateCount:
+                raise ValueError("%s was trained on %d states" % (path, len(array)))
+            # a memory map is kept as is for read-only use (get_result); Q stays an np.ndarray when R is one
+            if mmap:
+                self.Q = array
+            elif isinstance(self.R, np.ndarray):
+                self.Q = np.array(array, dtype=float)
+            else:
+                self.Q = array.tolist()
+        self.rebuild_max_q()
+        self.tick = header['tick']
+
+    def solve(self, tol=1e-9, max_iterations=10000):
+        """
+            Fixed point of Q(state, action) = R(state, action) + Gamma * Max[Q(next state, all actions)]
+            by vectorized value iteration, the values training converges to.
+        """
+        if self.graph is not None:
+            return self.solve_graph(tol, max_iterations)
+        R = np.array(self.R, dtype=float)
+        allowed = R >= 0
+        Q = np.zeros(R.shape)
+        iterations = 0
+        while iterations < max_iterations:
+            iterations += 1
+            # same as get_max_q: max over allowed actions, never below 0
+            max_q = np.maximum(np.where(allowed, Q, 0).max(axis=1), 0)
+            updated = np.where(allowed, R + self.Gamma * max_q[None, :], 0)
+            delta = np.abs(updated - Q).max()
+            Q = updated
+            if delta < tol:
+                break
+        self.Q = Q if isinstance(self.Q, np.ndarray) else Q.tolist()
+        self.rebuild_max_q()
+        return iterations
+
+    def solve_graph(self, tol=1e-9, max_iterations=10000):
+        """ solve() over the edges of the graph """
+        graph = self.graph
+        Q = np.zeros(len(graph.indices))
+        iterations = 0
+        while iterations < max_iterations:
+            iterations += 1
+            updated = graph.rewards + self.Gamma * graph.row_max(Q)[graph.indices]
+            delta = np.abs(updated - Q).max() if len(Q) else 0.
+            Q = updated
+            if delta < tol:
+                break
+        self.Q.values = Q
+        self.rebuild_max_q()
+        return iterations
 
     def next_state(self):
         return random.choice(range(self.MaxStateCount))
 
     def normalize_q(self):
-        max = 0.
-        for row in self.Q:
-            for v in row:
-                if v > max:
-                    max = v
-
-        for ndx, value in enumerate(self.Q):
-            for idx, q_value in enumerate(value):
-                self.Q[ndx][idx] *= 100 / max
+        if self.graph is not None:
+            Q = self.Q.values
+        else:
+            Q = np.array(self.Q, dtype=float)
+        # a ZeroDivisionError for an untrained Q, as before
+        Q = Q * (100 / float(max(Q.max(initial=0.), 0.)))
+        if self.graph is not None:
+            self.Q.values = Q
+        else:
+            self.Q = Q if isinstance(self.Q, np.ndarray) else Q.tolist()
+        self.rebuild_max_q()
 
     @staticmethod
     def print_q(q_matrix):
-        for row in q_matrix:
-            for val in row:
-                print('%5.0f' % val, end='')
+        if isinstance(q_matrix, EdgeMatrix):
+            # one line per edge, a dense print of a graph would be nodes ** 2 cells
+            graph = q_matrix.graph
+            edges = zip(graph.sources.tolist(), graph.indices.tolist(), np.asarray(q_matrix.values).tolist())
+            sys.stdout.write('\n'.join('%d -> %d %5.0f' % edge for edge in edges))
             print()
+            return
+        sys.stdout.write('\n'.join(''.join(row) for row in np.char.mod('%5.0f', np.asarray(q_matrix, dtype=float))))
+        print()
 
     def get_result(self, q_matrix, start_state):
         i = 0
@@ -98,7 +270,9 @@ class QLearning():
         while i < limit:
             max = -1
             print("%d -> " % state, end='')
-            for idx, value in enumerate(self.Q[state]):
+            next_state = state
+            for idx in self.get_allowed_actions(state):
+                value = self.Q[state][idx]
                 if value > max:
                     max = value
                     next_state = idx
@@ -108,8 +282,8 @@ class QLearning():
             i += 1
 
 
-def run():
-    q_learning = QLearning()
+def run(rewards=None, graph=None):
+    q_learning = QLearning(rewards, graph)
 
     q_learning.training()
 
@@ -123,7 +297,14 @@ def run():
 
 
 if __name__ == '__main__':
-    run()
+    # main.py [rewards matrix file | edge list file (.edges / .npz)]
+    path = sys.argv[1] if len(sys.argv) > 1 else None
+    if path is None:
+        run()
+    elif path.endswith(('.edges', '.npz')):
+        run(graph=Graph.load(path))
+    else:
+        run(maps.load(path))
 
     """
     $python main.py
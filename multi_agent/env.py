@@ -0,0 +1,61 @@
+import numpy as np
+
+from multi_agent.q_table import allowed_mask, next_cells
+from multi_agent.rewards import RewardEngine
+
+try:
+    xrange
+except NameError:
+    xrange = range
+
+
+class AgentModel:
+    """
+        Movement of an agent with a given shift, as integer tables.
+        next_state[cell][action] - cell the action leads to (only for allowed actions)
+        allowed[cell] - allowed action indexes, allowed_bits[cell] - the same as a bitmask
+        states[cell] - one State per cell, used as a key by dict Q tables and for rendering
+    """
+
+    def __init__(self, q_learning, shift):
+        self.shift = shift
+        width = q_learning.WIDTH
+        cells = width * q_learning.HEIGHT
+        self.states = [q_learning.make_state(cell % width, cell // width, shift) for cell in xrange(cells)]
+        self.mask = allowed_mask(q_learning, shift)
+        self.next_cell = next_cells(width, q_learning.HEIGHT, self.mask, shift)
+        self.allowed_bits = (self.mask * (1 << np.arange(self.mask.shape[1]))).sum(axis=1)
+        # plain lists for the scalar training loop
+        self.next_state = self.next_cell.tolist()
+        self.allowed = [np.flatnonzero(row).tolist() for row in self.mask]
+
+
+class Environment:
+    """
+        The ROOM world compiled once into integer tables, so training allocates nothing per step.
+        cell = y * WIDTH + x, action = index in ACTIONS.
+    """
+
+    def __init__(self, q_learning):
+        self.q_learning = q_learning
+        self.WIDTH = q_learning.WIDTH
+        self.HEIGHT = q_learning.HEIGHT
+        self.cells = self.WIDTH * self.HEIGHT
+
+        room = np.asarray(q_learning.ROOM).ravel()
+        self.room = room
+        self.xs = [cell % self.WIDTH for cell in xrange(self.cells)]
+        self.ys = [cell // self.WIDTH for cell in xrange(self.cells)]
+        self.death = (room == q_learning.DEATH).tolist()
+        self.win = (room == q_learning.WIN).tolist()
+        self.rewards = RewardEngine.from_q(q_learning)
+
+        self.agents = {}
+
+    def agent(self, shift):
+        if shift not in self.agents:
+            self.agents[shift] = AgentModel(self.q_learning, shift)
+        return self.agents[shift]
+
+    def cell(self, state):
+        return state.y * self.WIDTH + state.x
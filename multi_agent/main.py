@@ -1,31 +1,67 @@
 #!/usr/bin/env python
 from __future__ import print_function
-import random
 import os
 import time
 import sys
+import numpy as np
 # import matplotlib.pyplot as plt
 
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from common import checkpoint, maps
+from common.progress import Progress
+from common.replay import ReplayBuffer
+from common.statistics import Statistics
+from common.trajectory import TrajectoryWriter
+from multi_agent.env import Environment
+from multi_agent.policy import Policy
+from multi_agent.q_table import ACTIONS, Q_TABLES
+from multi_agent.swarm import SwarmTrainer
+
 try:
     xrange
 except NameError:
     xrange = range
 
 def timer(fn):
-    def wrapped(*args, **kwargs):
+    def wrapped(self, *args, **kwargs):
         start_time = time.time()
-        fn(*args, **kwargs)
-        print("\n--- %s seconds ---" % (time.time() - start_time))
+        result = fn(self, *args, **kwargs)
+        if not self.headless:
+            print("\n--- %s seconds ---" % (time.time() - start_time))
+        return result
 
     return wrapped
 
 
-class State:
-    def __init__(self, x=0, y=0, movement='', shift=1):
-        self.x = x
-        self.y = y
-        self.shift = shift
-        self.movement = movement
+class State(object):
+    """
+        Immutable and interned: there is one State per (x, y, movement, shift), so the many dict keys
+        and moves that refer to the same cell share an object. Equality and hash ignore movement and shift.
+    """
+    __slots__ = ('x', 'y', 'shift', 'movement', '_hash')
+    _instances = {}
+
+    def __new__(cls, x=0, y=0, movement='', shift=1):
+        key = (x, y, movement, shift)
+        state = cls._instances.get(key)
+        if state is None:
+            state = object.__new__(cls)
+            object.__setattr__(state, 'x', x)
+            object.__setattr__(state, 'y', y)
+            object.__setattr__(state, 'shift', shift)
+            object.__setattr__(state, 'movement', movement)
+            object.__setattr__(state, '_hash', hash((x, y)))
+            cls._instances[key] = state
+        return state
+
+    def __setattr__(self, name, value):
+        raise AttributeError("State is immutable")
+
+    def __reduce__(self):
+        return State, (self.x, self.y, self.movement, self.shift)
 
     def move_left(self):
         return State(self.x - self.shift, self.y, 'left', shift=self.shift)
@@ -43,10 +79,10 @@ class State:
         return State(self.x, self.y, 'none', shift=self.shift)
 
     def __hash__(self):
-        return hash((self.x, self.y))
+        return self._hash
 
     def __eq__(self, other):
-        return (self.x, self.y) == (other.x, other.y)
+        return self is other or (self.x, self.y) == (other.x, other.y)
 
     def __ne__(self, other):
         return not (self == other)
@@ -56,20 +92,50 @@ class State:
 
 
 class QLearning:
-    def __init__(self):
+    # methods timed by common.profiler.Profiler, phase -> [(attribute holding the method, '' for self, method)]
+    PROFILE_PHASES = {
+        'choose_next_action': [('', 'next_actions')],
+        'get_rewards': [('', 'get_cell_rewards')],
+        'get_max_q': [('q1', 'max_value'), ('q2', 'max_value')],
+        'get_updated_q': [('', 'get_updated_q')],
+        'statistics': [('', 'capture_statistics')],
+    }
+
+    def __init__(self, q_table='dict', headless=False, progress=None, room=None, statistics_path=None):
         self.GAMMA = 0.9
         self.EPSILON = 0.3
         self.EPOCHS = 500
         self.INIT_Q_VALUE = 0
         self.FRAME_RATE = 0.1
         self.WALK_REWARDS = -0.1
+        self.ALPHA_DECAY = 0.1
         self.MAX_ITERATIONS = 100000
+        self.Q_TABLE = q_table
+        # headless: no terminal rendering or per-tick statistics at all
+        # progress: when to print statistics while training, False turns it off
+        self.headless = headless
+        if headless or progress is False:
+            self.progress = None
+        else:
+            self.progress = progress or Progress(interval=0.1)
         self.DEATH = -100
         self.WIN = 100
+        self.MAX_DISTANCE = 3
 
         self.success = 0
         self.failures = 0
         self.tick = 1
+        # optional common.convergence.Convergence, stops training early; its policy is the outcome of the
+        # greedy path from the training start cells, see greedy_outcome
+        self.convergence = None
+        self.greedy_start = None
+        self.stop_reason = None
+        # optional pair of common.replay.ReplayBuffer for q1 / q2, see use_replay
+        self.replay = None
+        # common.profiler.Profiler while one is attached (attach it after q1 / q2 are made)
+        self.profiler = None
+        # common.trajectory.TrajectoryWriter logging every step of both agents, see record()
+        self.recorder = None
 
         self.ROOM = [
             [0, 0, 0, 0, 0, 0, -100, 0, 0, 0, 0, 0, 0, 0, 0, 0],
@@ -82,28 +148,35 @@ class QLearning:
             [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, -100, 0, 0],
             [0, 0, -100, -100, -100, -100, -100, -100, -100, -100, -100, -100, -100, -100, 0, 100]
         ]
+        # any other room, e.g. from common.maps
+        if room is not None:
+            self.ROOM = room
 
         self.HEIGHT = len(self.ROOM)
         self.WIDTH = len(self.ROOM[0])
 
+        self.env = None
         self.q1 = {}
         self.q2 = {}
 
-        self.statistics = {'Q1': [], 'Q2': [], 'r1': [], 'r2': [], 'iter': []}
+        # dQ1/dQ2 are |Q change| of the updates, so their window means are the mean |dQ|
+        # window means are appended to statistics_path as CSV when given, closed at the end of training()
+        self.statistics = Statistics(('Q1', 'Q2', 'r1', 'r2', 'dQ1', 'dQ2'), path=statistics_path)
 
     def init_q(self, shift1, shift2):
-        Q = {}
-        agent1_possible_states = self.get_all_possible_states(shift=shift1)
-        agent2_possible_states = self.get_all_possible_states(shift=shift2)
-        for agent1 in agent1_possible_states:
-            agent1_allowed_actions = self.get_allowed_actions(agent1)
-            Q[agent1] = {}
-            for agent2 in agent2_possible_states:
-                temp = {}
-                for action in agent1_allowed_actions:
-                    temp[action()] = self.INIT_Q_VALUE
-                Q[agent1][agent2] = temp
-        return Q
+        if self.env is None:
+            self.env = Environment(self)
+        return Q_TABLES[self.Q_TABLE](self, shift1, shift2)
+
+    def set_room(self, room):
+        """ Switches to another room, q1 / q2 have to be made again with init_q """
+        self.ROOM = room
+        self.HEIGHT = len(room)
+        self.WIDTH = len(room[0])
+        self.env = None
+
+    def make_state(self, x, y, shift):
+        return State(x, y, shift=shift)
 
     def get_possible_states_of_partner(self, agent, limit=3):
         possible_states = []
@@ -149,39 +222,25 @@ class QLearning:
         return allowed
 
     def choose_next_action(self, agent_a, agent_b, agent_a_Q, randomly=True):
-        allowed = list(agent_a_Q[agent_a][agent_b].items())
-        if randomly and random.random() < self.EPSILON:
-            return random.choice(allowed)[0]
-        else:
-            q = [a[1] for a in allowed]
-            max_q = max(q)
-            count = q.count(max_q)
-            if count > 1:
-                best = [a for a in allowed if a[1] == max_q]
-                return random.choice(best)[0]
-            else:
-                return [a[0] for a in allowed if a[1] == max_q][0]
+        return agent_a_Q.choose_action(agent_a, agent_b, self.EPSILON, randomly)
 
     def get_max_q(self, Q, st1, st2):
-        allowed = list(Q[st1][st2].items())
-        max_v = allowed[0][1]
-        for allowed_state in allowed:
-            if allowed_state[1] > max_v:
-                max_v = allowed_state[1]
-        return max_v
+        return Q.get_max_q(st1, st2)
 
     def get_updated_q(self, Q, st1, st2, action, alpha, r, maxQ):
         """
             Q[s',a'] = Q[s',a'] + alpha * (reward + gamma * MAX(Q,s) - Q[s',a'])
             #  s' -> old state
+            #  st1 / st2 are cells, action an action index
         """
-        return Q[st1][st2][action] + alpha * (r + self.GAMMA * maxQ - Q[st1][st2][action])
+        q = Q.value(st1, st2, action)
+        return q + alpha * (r + self.GAMMA * maxQ - q)
 
     def is_game_failed(self, state):
         return self.ROOM[state.y][state.x] == self.DEATH
 
     def is_agents_too_far_away(self, st1, st2):
-        return self.calc_distance(st1, st2) > 3
+        return self.calc_distance(st1, st2) > self.MAX_DISTANCE
 
     def calc_distance(self, st1, st2):
         return (pow(st1.x - st2.x, 2) + pow(st1.y - st2.y, 2)) ** .5
@@ -190,111 +249,241 @@ class QLearning:
         return self.ROOM[state.y][state.x] == self.WIN
 
     def get_rewards(self, act1, act2, st1, st2):
-        r1 = r2 = self.WALK_REWARDS
-        restart = False
-        fail = False
-        win = False
-
-        if act1.x == act2.x and act1.y == act2.y:
-            # r1 = r2 = -1.
-            pass
-
-        if self.is_game_won(act1) or self.is_game_won(act2):
-            r1 = r2 = self.WIN
-            win = True
-
-        if self.is_agents_too_far_away(act1, st2) and self.is_agents_too_far_away(act1, act2):
-            r1 = self.DEATH
-            fail = True
-
-        if self.is_agents_too_far_away(act2, st1) and self.is_agents_too_far_away(act1, act2):
-            r2 = self.DEATH
-            fail = True
-
-        if self.is_game_failed(act1):
-            r1 = self.DEATH
-            fail = True
-
-        if self.is_game_failed(act2):
-            r2 = self.DEATH
-            fail = True
+        cell = self.env.cell
+        return self.get_cell_rewards(cell(act1), cell(act2), cell(st1), cell(st2))
 
+    def get_cell_rewards(self, act1, act2, st1, st2):
+        """ get_rewards on cells of the compiled environment """
+        r1, r2, fail, win = self.env.rewards.step(act1, act2, st1, st2)
         if fail:
             self.failures += 1
-            restart = True
         elif win:
             self.success += 1
-            restart = True
+        return r1, r2, fail or win
 
-        return r1, r2, restart
+    def get_batch_rewards(self, act1, act2, st1, st2):
+        """ (r1, r2, failed, won) arrays for arrays of cells, nothing is counted """
+        if self.env is None:
+            self.env = Environment(self)
+        return self.env.rewards.batch(act1, act2, st1, st2)
 
     def mark_worst_as_dangerous(self, q, st1, st2, action, rewards):
         if rewards == self.DEATH:
             self.mark_danger_states(q, st1, st2, action)
 
     def next_actions(self, st1, st2):
-        return self.choose_next_action(st1, st2, self.q1), self.choose_next_action(st2, st1, self.q2)
+        return self.q1.choose(st1, st2, self.EPSILON), self.q2.choose(st2, st1, self.EPSILON)
 
     @timer
     def training(self, start_st1, start_st2):
-        alpha = 1
-        st1, st2 = start_st1, start_st2
+        # resumes the learning rate schedule when continuing from a checkpoint
+        alpha = pow(max(self.tick - 1, 1), -self.ALPHA_DECAY)
+        # the loop works on integer cells / action indexes of the compiled environment
+        agent1, agent2 = self.env.agent(start_st1.shift), self.env.agent(start_st2.shift)
+        start1, start2 = self.env.cell(start_st1), self.env.cell(start_st2)
+        st1, st2 = start1, start2
+        self.greedy_start = (agent1, agent2, start1, start2)
         act1, act2 = self.next_actions(st1, st2)
         self.FRAME_RATE = 0.1
+        cells = self.WIDTH * self.HEIGHT
+        episode, step = self.success + self.failures, 0
 
         while self.failures < self.MAX_ITERATIONS and self.success < self.EPOCHS:
 
-            old_st1, old_st2 = st1, st2
-            old_act1, old_act2 = act1, act2
+            next1 = agent1.next_state[st1][act1]
+            next2 = agent2.next_state[st2][act2]
 
-            r1, r2, restart = self.get_rewards(act1, act2, st1, st2)
+            r1, r2, restart = self.get_cell_rewards(next1, next2, st1, st2)
 
-            max_q1 = self.get_max_q(self.q1, act1, act2)
-            max_q2 = self.get_max_q(self.q2, act2, act1)
+            max_q1 = self.q1.max_value(next1, next2)
+            max_q2 = self.q2.max_value(next2, next1)
 
-            u1 = self.get_updated_q(self.q1, old_st1, old_st2, old_act1, alpha, r1, max_q1)
-            u2 = self.get_updated_q(self.q2, old_st2, old_st1, old_act2, alpha, r2, max_q2)
+            old_q1 = self.q1.value(st1, st2, act1)
+            old_q2 = self.q2.value(st2, st1, act2)
 
-            self.q1[old_st1][old_st2][old_act1] = u1
-            self.q2[old_st2][old_st1][old_act2] = u2
+            u1 = self.get_updated_q(self.q1, st1, st2, act1, alpha, r1, max_q1)
+            u2 = self.get_updated_q(self.q2, st2, st1, act2, alpha, r2, max_q2)
+
+            self.q1.write(st1, st2, act1, u1)
+            self.q2.write(st2, st1, act2, u2)
 
             self.mark_worst_as_dangerous(self.q1, st1, st2, act1, r1)
             self.mark_worst_as_dangerous(self.q2, st2, st1, act2, r2)
 
+            if self.replay is not None:
+                self.remember(self.q1, self.replay[0], alpha, (st1, st2), act1, r1, (next1, next2), restart)
+                self.remember(self.q2, self.replay[1], alpha, (st2, st1), act2, r2, (next2, next1), restart)
+
+            if self.recorder is not None:
+                self.recorder.append(episode, step, st1 * cells + st2, act1, r1, u1, agent=0)
+                self.recorder.append(episode, step, st2 * cells + st1, act2, r2, u2, agent=1)
+
             if restart:
-                st1, st2 = start_st1, start_st2
+                st1, st2 = start1, start2
+                episode, step = episode + 1, 0
             else:
-                st1, st2 = act1, act2
+                st1, st2 = next1, next2
+                step += 1
 
             act1, act2 = self.next_actions(st1, st2)
 
-            alpha = pow(self.tick, -0.1)
+            alpha = pow(self.tick, -self.ALPHA_DECAY)
             self.tick += 1
 
-            self.show_statistics()
+            if self.progress is not None and self.progress.ready(self.tick):
+                self.show_statistics()
 
-            self.capture_statistics(r1, r2, u1, u2)
+            self.capture_statistics(r1, r2, u1, u2, abs(u1 - old_q1), abs(u2 - old_q2))
 
-    def capture_statistics(self, r1, r2, u1, u2):
-        self.statistics["Q1"].append(u1)
-        self.statistics["Q2"].append(u2)
-        self.statistics["r1"].append(r1)
-        self.statistics["r2"].append(r2)
-        self.statistics["iter"].append(self.tick)
+            if self.profiler is not None:
+                self.profiler.step(self.tick)
+
+            # updates of actions just removed as dangerous are not part of the learned Q
+            if self.convergence is not None and self.convergence.step(
+                    self.tick, max(0 if r1 == self.DEATH else abs(u1 - old_q1),
+                                   0 if r2 == self.DEATH else abs(u2 - old_q2)), self.greedy_outcome):
+                self.stop_reason = self.convergence.reason
+                break
+        else:
+            if self.success >= self.EPOCHS:
+                self.stop_reason = 'epochs: %d successes' % self.success
+            else:
+                self.stop_reason = 'max iterations: %d failures' % self.failures
+
+        if self.progress is not None:
+            self.show_statistics()
+        if self.recorder is not None:
+            self.recorder.flush()
+        self.statistics.close()
+
+    def training_swarm(self, agents, shared=False, seed=None):
+        """ Trains any number of agents (States with their shifts) on local observations, see SwarmTrainer """
+        trainer = SwarmTrainer(self, agents, shared, seed)
+        trainer.training()
+        if not self.headless:
+            trainer.show_statistics()
+        return trainer
+
+    def record(self, path, chunk_size=65536):
+        """ Logs every training step to path (common.trajectory), state = own cell * cells + partner cell """
+        self.recorder = TrajectoryWriter(path, chunk_size, program='multi_agent', actions=ACTIONS,
+                                         state_index='(y * WIDTH + x) * WIDTH * HEIGHT + partner y * WIDTH + x',
+                                         WIDTH=self.WIDTH, HEIGHT=self.HEIGHT)
+        return self.recorder
+
+    def use_replay(self, capacity=10000, batch_size=32, prioritized=False, seed=None):
+        self.replay = tuple(ReplayBuffer(capacity, batch_size, 2, prioritized, seed=seed)
+                            for seed in np.random.SeedSequence(seed).spawn(2))
+        return self.replay
+
+    def remember(self, q, replay, alpha, state, action, reward, next_state, done):
+        # an action that led to death is removed from the table (mark_danger_states), so it is not stored
+        if reward != self.DEATH:
+            replay.add(state, action, reward, next_state, done)
+        if replay.ready():
+            self.replay_batch(q, replay, alpha)
+
+    def replay_batch(self, q, replay, alpha):
+        """
+            Re-applies get_updated_q to a sampled minibatch, in one shot on the tensor table.
+            Transitions whose action has been removed since they were stored are skipped.
+        """
+        idx, (st1, st2), action, reward, (next1, next2), _ = replay.sample()
+        if q.vectorized:
+            keep = q.has_action(st1, st2, action)
+            idx, st1, st2, action, reward, next1, next2 = \
+                idx[keep], st1[keep], st2[keep], action[keep], reward[keep], next1[keep], next2[keep]
+            old_q = q.value(st1, st2, action)
+            updated_q = self.get_updated_q(q, st1, st2, action, alpha, reward, q.max_value(next1, next2))
+            q.write_many(st1, st2, action, updated_q)
+        else:
+            keep = [i for i in xrange(len(idx)) if q.has_action(st1[i], st2[i], action[i])]
+            idx = idx[keep]
+            old_q = np.empty(len(idx))
+            updated_q = np.empty(len(idx))
+            for j, i in enumerate(keep):
+                c1, c2, a = st1[i], st2[i], action[i]
+                old_q[j] = q.value(c1, c2, a)
+                updated_q[j] = self.get_updated_q(q, c1, c2, a, alpha, reward[i], q.max_value(next1[i], next2[i]))
+                q.write(c1, c2, a, updated_q[j])
+        replay.update_priorities(idx, updated_q - old_q)
+
+    def greedy_actions(self):
+        return np.concatenate((self.q1.argmax().ravel(), self.q2.argmax().ravel()))
+
+    def greedy_path(self):
+        """
+            Greedy joint path from the training start cells, [(cell1, cell2, action1, action2), ...] up to
+            a win, a death, a stuck pair or `cells` steps. Returns (path, won).
+        """
+        agent1, agent2, c1, c2 = self.greedy_start
+        path = []
+        for _ in xrange(self.env.cells):
+            a1, a2 = self.q1.best_action(c1, c2), self.q2.best_action(c2, c1)
+            path.append((c1, c2, a1, a2))
+            n1, n2 = agent1.next_state[c1][a1], agent2.next_state[c2][a2]
+            _, _, failed, won = self.env.rewards.step(n1, n2, c1, c2)
+            if failed or won:
+                return path, won
+            if (n1, n2) == (c1, c2):
+                break
+            c1, c2 = n1, n2
+        return path, False
+
+    def greedy_outcome(self):
+        """
+            The policy Convergence checks: the steps of a winning greedy_path. Exploration keeps swapping
+            equally good routes, and most joint states are never visited, so the whole argmax never settles.
+            A path that does not win is never stable (it carries the tick).
+        """
+        path, won = self.greedy_path()
+        return np.array([len(path) if won else -self.tick])
+
+    def compile_policy(self, shift1, shift2):
+        return Policy.from_q(self, shift1, shift2)
+
+    def save(self, path, shift1, shift2):
+        checkpoint.save(path, np.stack((self.q1.to_array(), self.q2.to_array())),
+                        program='multi_agent', q_table=self.Q_TABLE,
+                        state_index='[agent, y * WIDTH + x, partner y * WIDTH + x, action]',
+                        actions=ACTIONS, WIDTH=self.WIDTH, HEIGHT=self.HEIGHT, shifts=[shift1, shift2],
+                        tick=self.tick, success=self.success, failures=self.failures,
+                        GAMMA=self.GAMMA, EPSILON=self.EPSILON, WALK_REWARDS=self.WALK_REWARDS,
+                        ALPHA_DECAY=self.ALPHA_DECAY)
+
+    def load(self, path, mmap=False):
+        """ Rebuilds q1 / q2 from a checkpoint, returns the agents' shifts """
+        array, header = checkpoint.load(path, mmap, program='multi_agent')
+        if (header['WIDTH'], header['HEIGHT']) != (self.WIDTH, self.HEIGHT):
+            raise ValueError("%s was trained on a %dx%d room" % (path, header['WIDTH'], header['HEIGHT']))
+        shift1, shift2 = header['shifts']
+        self.q1 = self.init_q(shift1, shift2)
+        self.q2 = self.init_q(shift2, shift1)
+        self.q1.from_array(array[0])
+        self.q2.from_array(array[1])
+        self.tick = header['tick']
+        self.success = header['success']
+        self.failures = header['failures']
+        return shift1, shift2
+
+    def capture_statistics(self, r1, r2, u1, u2, d1, d2):
+        self.statistics.append(self.tick, u1, u2, r1, r2, d1, d2)
 
     def mark_danger_states(self, q, st1, st2, act):
-        del (q[st1][st2][act])
+        q.remove_action(st1, st2, act)
 
     def show_progress(self, st1, st2, st1_action, st2_action, q1, q2):
+        if self.headless:
+            return
         os.system('cls' if os.name == 'nt' else 'clear')
         for i in xrange(self.HEIGHT):
             for j in xrange(self.WIDTH):
                 if st1_action.x == st2_action.x == j and st1_action.y == st2_action.y == i:
-                    print('\033[0;35;40m%6.2f' % q1[st1][st2][st1_action], end='')
+                    print('\033[0;35;40m%6.2f' % q1.get(st1, st2, st1_action), end='')
                 elif st1_action.x == j and st1_action.y == i:
-                    print('\033[0;34;40m%6.2f' % q1[st1][st2][st1_action], end='')
+                    print('\033[0;34;40m%6.2f' % q1.get(st1, st2, st1_action), end='')
                 elif st2_action.x == j and st2_action.y == i:
-                    print('\033[0;33;40m%6.2f' % q2[st2][st1][st2_action], end='')
+                    print('\033[0;33;40m%6.2f' % q2.get(st2, st1, st2_action), end='')
                 else:
                     if self.ROOM[i][j] == self.DEATH:
                         print('\033[1;31;40m%6s' % "x", end='')
@@ -305,18 +494,22 @@ class QLearning:
             print()
         print()
         print("\033[1;32;40mSuccess: %d, Failures: %d" % (self.success, self.failures))
-        # [print("%2.2f -- %s" % (i[1], i[0])) for i in self.Q[state].items()]
+        # [print("%2.2f -- %s" % (i[1], i[0])) for i in q1.actions(st1, st2)]
         time.sleep(self.FRAME_RATE)
 
-    def show_final_result(self, st1, st2, q1, q2):
-        steps = 0
+    def show_final_result(self, st1, st2, q1, q2, max_steps=None):
         self.FRAME_RATE = 0.35
         next_st1, next_st2 = st1, st2
-        print("Final result")
-        while True:
+        if max_steps is None:
+            max_steps = self.WIDTH * self.HEIGHT
+        if not self.headless:
+            print("Final result")
+        for steps in xrange(max_steps + 1):
 
             if self.is_game_won(next_st1) or self.is_game_won(next_st2):
                 print("Steps: %d" % steps)
+                return
+            if steps == max_steps:
                 break
 
             next_st1 = self.choose_next_action(st1, st2, q1, False)
@@ -326,47 +519,51 @@ class QLearning:
 
             st1 = next_st1
             st2 = next_st2
-
-            steps += 1
+        print("Goal not reached in %d steps" % max_steps)
 
     def show_statistics(self):
         sys.stdout.write('\rSuccess: %d, Failures: %d' % (self.success, self.failures))
         sys.stdout.flush()
 
     # def show_graph(self):
+    #     stats = self.statistics.windows()
     #     plt.subplot(221)
-    #     plt.plot(self.statistics["iter"], self.statistics["Q1"], lw=1)
+    #     plt.plot(stats["tick"], stats["Q1"], lw=1)
     #     plt.title('Iter/Q1')
     #
     #     plt.subplot(222)
-    #     plt.plot(self.statistics["iter"], self.statistics["Q2"], lw=1)
+    #     plt.plot(stats["tick"], stats["Q2"], lw=1)
     #     plt.title('Iter/Q2')
     #
     #     plt.subplot(223)
-    #     plt.plot(self.statistics["iter"], self.statistics["r1"], lw=1)
+    #     plt.plot(stats["tick"], stats["r1"], lw=1)
     #     plt.title('Iter/Rewards1')
     #
     #     plt.subplot(224)
-    #     plt.plot(self.statistics["iter"], self.statistics["r2"], lw=1)
+    #     plt.plot(stats["tick"], stats["r2"], lw=1)
     #     plt.title('Iter/Rewards2')
     #     plt.show()
 
 
-def run():
-    q_learn = QLearning()
+def run(q_table='dict', headless=False, room=None):
+    q_learn = QLearning(q_table, headless, room=room)
 
-    agent1 = State(1, 8, shift=1)
-    agent2 = State(0, 8, shift=2)
+    agent1 = State(1, q_learn.HEIGHT - 1, shift=1)
+    agent2 = State(0, q_learn.HEIGHT - 1, shift=2)
 
     q_learn.q1 = q_learn.init_q(agent1.shift, agent2.shift)
     q_learn.q2 = q_learn.init_q(agent2.shift, agent1.shift)
 
     q_learn.training(agent1, agent2)
 
+    print("Stopped on %s" % q_learn.stop_reason)
+    print("Q entries: %d, %d" % (len(q_learn.q1), len(q_learn.q2)))
+
     q_learn.show_final_result(agent1, agent2, q_learn.q1, q_learn.q2)
 
     # q_learn.show_graph()
 
 
 if __name__ == '__main__':
-    run()
+    # main.py [q_table [map file]]
+    run(*sys.argv[1:2], room=maps.load(sys.argv[2]) if len(sys.argv) > 2 else None)
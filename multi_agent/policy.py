@@ -0,0 +1,100 @@
+import numpy as np
+
+from multi_agent.q_table import ACTIONS, allowed_mask, next_cells
+from multi_agent.rewards import RewardEngine
+
+
+class Policy:
+    """
+        Frozen greedy joint policy: actions1[c1, c2] = argmax q1[c1, c2], actions2[c2, c1] = argmax q2[c2, c1],
+        plus per-agent next_cell tables. cell = y * WIDTH + x.
+        Ties go to the first action in ACTIONS order (training breaks them randomly).
+    """
+
+    def __init__(self, actions1, actions2, next1, next2, won, death, width, max_distance=3):
+        self.actions1 = actions1
+        self.actions2 = actions2
+        self.next1 = next1
+        self.next2 = next2
+        self.won = won
+        self.death = death
+        self.WIDTH = width
+        self.max_distance = max_distance
+        self.rewards = RewardEngine(death, won, width, max_distance)
+
+    @classmethod
+    def from_q(cls, q_learning, shift1, shift2):
+        room = np.asarray(q_learning.ROOM).ravel()
+        return cls(np.argmax(np.asarray(q_learning.q1.to_array()), axis=2),
+                   np.argmax(np.asarray(q_learning.q2.to_array()), axis=2),
+                   next_cells(q_learning.WIDTH, q_learning.HEIGHT, allowed_mask(q_learning, shift1), shift1),
+                   next_cells(q_learning.WIDTH, q_learning.HEIGHT, allowed_mask(q_learning, shift2), shift2),
+                   room == q_learning.WIN, room == q_learning.DEATH, q_learning.WIDTH, q_learning.MAX_DISTANCE)
+
+    def cell(self, state):
+        if isinstance(state, (int, np.integer)):
+            return state
+        return state.y * self.WIDTH + state.x
+
+    def act(self, st1, st2):
+        """ Greedy action indexes (see ACTIONS) of both agents for States or cells """
+        c1, c2 = self.cell(st1), self.cell(st2)
+        return self.actions1[c1, c2], self.actions2[c2, c1]
+
+    def action_names(self, st1, st2):
+        return tuple(ACTIONS[a] for a in self.act(st1, st2))
+
+    def step(self, c1, c2):
+        c1, c2 = np.asarray(c1), np.asarray(c2)
+        return self.next1[c1, self.actions1[c1, c2]], self.next2[c2, self.actions2[c2, c1]]
+
+    def rollout(self, start1, start2, max_steps=None):
+        """
+            Follows the policy from many joint start positions at once, with the training win / death rules.
+            Returns steps to the goal per start pair, -1 where it fails or never gets there.
+        """
+        c1, c2 = np.array(start1, copy=True), np.array(start2, copy=True)
+        if max_steps is None:
+            max_steps = len(self.next1)
+        steps = np.full(len(c1), -1)
+        active = np.ones(len(c1), dtype=bool)
+        for step in range(1, max_steps + 1):
+            if not active.any():
+                break
+            n1, n2 = self.step(c1, c2)
+            _, _, failed, won = self.rewards.batch(n1, n2, c1, c2)
+            steps[active & won] = step
+            active &= ~(won | failed)
+            c1, c2 = np.where(active, n1, c1), np.where(active, n2, c2)
+        return steps
+
+    def path(self, st1, st2, max_steps=None):
+        """
+            Joint cells [(c1, c2), ...] from the start until the agents win, die, stop moving or run out of steps.
+            Returns (path, won).
+        """
+        c1, c2 = int(self.cell(st1)), int(self.cell(st2))
+        path = [(c1, c2)]
+        if max_steps is None:
+            max_steps = len(self.next1)
+        for _ in range(max_steps):
+            n1, n2 = self.step(c1, c2)
+            n1, n2 = int(n1), int(n2)
+            _, _, failed, won = self.rewards.step(n1, n2, c1, c2)
+            if (n1, n2) == (c1, c2) and not (failed or won):
+                break
+            path.append((n1, n2))
+            if failed or won:
+                return path, won
+            c1, c2 = n1, n2
+        return path, False
+
+    def save(self, path):
+        np.savez(path, actions1=self.actions1, actions2=self.actions2, next1=self.next1, next2=self.next2,
+                 won=self.won, death=self.death, width=self.WIDTH, max_distance=self.max_distance)
+
+    @classmethod
+    def load(cls, path):
+        data = np.load(path)
+        return cls(data['actions1'], data['actions2'], data['next1'], data['next2'], data['won'], data['death'],
+                   int(data['width']), int(data['max_distance']))
@@ -0,0 +1,350 @@
+import random
+
+import numpy as np
+
+from common.max_cache import MaxCache
+
+# Order matches QLearning.get_allowed_actions, so both tables walk actions identically
+ACTIONS = ('none', 'left', 'right', 'top', 'bottom')
+ACTION_INDEX = dict((name, idx) for idx, name in enumerate(ACTIONS))
+# (dx, dy) per ACTIONS entry, scaled by the agent's shift
+ACTION_DELTAS = ((0, 0), (-1, 0), (1, 0), (0, -1), (0, 1))
+
+
+def allowed_mask(q_learning, shift):
+    """ (cells, 5) mask of the actions an agent with this shift may take from each cell """
+    mask = np.zeros((q_learning.WIDTH * q_learning.HEIGHT, len(ACTIONS)), dtype=bool)
+    for agent in q_learning.get_all_possible_states(shift=shift):
+        for action in q_learning.get_allowed_actions(agent):
+            mask[agent.y * q_learning.WIDTH + agent.x, ACTION_INDEX[action().movement]] = True
+    return mask
+
+
+def next_cells(width, height, mask, shift):
+    """ next_cell[cell, action] for an agent with this shift, disallowed actions stay in place """
+    deltas = np.array(ACTION_DELTAS) * shift
+    cells = np.arange(width * height)
+    xs, ys = cells % width, cells // width
+    next_cell = (ys[:, None] + deltas[:, 1]) * width + (xs[:, None] + deltas[:, 0])
+    return np.where(mask, next_cell, cells[:, None])
+
+
+class DictQTable:
+    """ Q[agent][partner][next_state] = value, the original triple-nested dict layout """
+    # int API takes one joint state at a time only
+    vectorized = False
+
+    def __init__(self, q_learning, shift1, shift2):
+        self.WIDTH = q_learning.WIDTH
+        self.HEIGHT = q_learning.HEIGHT
+        self.Q = {}
+        agent1_possible_states = q_learning.get_all_possible_states(shift=shift1)
+        agent2_possible_states = q_learning.get_all_possible_states(shift=shift2)
+        for agent1 in agent1_possible_states:
+            agent1_allowed_actions = q_learning.get_allowed_actions(agent1)
+            self.Q[agent1] = {}
+            for agent2 in agent2_possible_states:
+                temp = {}
+                for action in agent1_allowed_actions:
+                    temp[action()] = q_learning.INIT_Q_VALUE
+                self.Q[agent1][agent2] = temp
+        self.init_cells(q_learning, shift1, shift2)
+
+    def init_cells(self, q_learning, shift1, shift2):
+        # integer API: cells and action indexes map onto the same State keys
+        agent, partner = q_learning.env.agent(shift1), q_learning.env.agent(shift2)
+        self.states1 = agent.states
+        self.states2 = partner.states
+        self.next_state = agent.next_state
+        # greedy actions for argmax(), built once and then updated from the (c1, c2) written since
+        self.greedy = None
+        self.dirty = set()
+
+    def __len__(self):
+        return sum(len(partners) for partners in self.Q.values())
+
+    def cell(self, state):
+        return state.y * self.WIDTH + state.x
+
+    def to_array(self):
+        cells = self.WIDTH * self.HEIGHT
+        array = np.full((cells, cells, len(ACTIONS)), -np.inf)
+        for st1, partners in self.Q.items():
+            for st2, actions in partners.items():
+                for action, value in actions.items():
+                    array[self.cell(st1), self.cell(st2), ACTION_INDEX[action.movement]] = value
+        return array
+
+    def from_array(self, array):
+        self.greedy = None
+        for st1, partners in self.Q.items():
+            for st2, actions in partners.items():
+                for action in list(actions):
+                    value = array[self.cell(st1), self.cell(st2), ACTION_INDEX[action.movement]]
+                    if np.isfinite(value):
+                        actions[action] = float(value)
+                    else:
+                        del (actions[action])
+
+    def row(self, st1, st2):
+        return self.Q[st1][st2]
+
+    def entry(self, st1, st2):
+        return self.Q[st1][st2]
+
+    def get(self, st1, st2, action):
+        return self.row(st1, st2)[action]
+
+    def set(self, st1, st2, action, value):
+        self.entry(st1, st2)[action] = value
+
+    def remove(self, st1, st2, action):
+        del (self.entry(st1, st2)[action])
+
+    def actions(self, st1, st2):
+        return list(self.row(st1, st2).items())
+
+    def get_max_q(self, st1, st2):
+        allowed = list(self.row(st1, st2).items())
+        max_v = allowed[0][1]
+        for allowed_state in allowed:
+            if allowed_state[1] > max_v:
+                max_v = allowed_state[1]
+        return max_v
+
+    def choose_action(self, st1, st2, epsilon, randomly=True):
+        allowed = list(self.row(st1, st2).items())
+        if randomly and random.random() < epsilon:
+            return random.choice(allowed)[0]
+        else:
+            q = [a[1] for a in allowed]
+            max_q = max(q)
+            count = q.count(max_q)
+            if count > 1:
+                best = [a for a in allowed if a[1] == max_q]
+                return random.choice(best)[0]
+            else:
+                return [a[0] for a in allowed if a[1] == max_q][0]
+
+    def value(self, c1, c2, action):
+        return self.get(self.states1[c1], self.states2[c2], self.states1[self.next_state[c1][action]])
+
+    def write(self, c1, c2, action, value):
+        self.set(self.states1[c1], self.states2[c2], self.states1[self.next_state[c1][action]], value)
+        if self.greedy is not None:
+            self.dirty.add((c1, c2))
+
+    def has_action(self, c1, c2, action):
+        return self.states1[self.next_state[c1][action]] in self.row(self.states1[c1], self.states2[c2])
+
+    def remove_action(self, c1, c2, action):
+        self.remove(self.states1[c1], self.states2[c2], self.states1[self.next_state[c1][action]])
+        if self.greedy is not None:
+            self.dirty.add((c1, c2))
+
+    def best_action(self, c1, c2):
+        """ First action at the max in ACTIONS order, 0 when every action was removed (as np.argmax) """
+        row = self.row(self.states1[c1], self.states2[c2])
+        if not row:
+            return 0
+        best = max(row.values())
+        return min(ACTION_INDEX[a.movement] for a, value in row.items() if value == best)
+
+    def argmax(self):
+        """
+            Greedy action index per (agent cell, partner cell), the first at the max in ACTIONS order.
+            Only the first call reads the whole table, later ones rescan what the int API wrote since.
+        """
+        if self.greedy is None:
+            self.greedy = np.argmax(self.to_array(), axis=2)
+        else:
+            for c1, c2 in self.dirty:
+                self.greedy[c1, c2] = self.best_action(c1, c2)
+        self.dirty = set()
+        return self.greedy.copy()
+
+    def max_value(self, c1, c2):
+        return self.get_max_q(self.states1[c1], self.states2[c2])
+
+    def choose(self, c1, c2, epsilon, randomly=True):
+        return ACTION_INDEX[self.choose_action(self.states1[c1], self.states2[c2], epsilon, randomly).movement]
+
+
+class LazyQTable(DictQTable):
+    """
+        Same layout as DictQTable, but a (agent, partner) entry is created only when it is first written.
+        Reads of missing entries see INIT_Q_VALUE for every allowed action.
+    """
+
+    def __init__(self, q_learning, shift1, shift2):
+        self.WIDTH = q_learning.WIDTH
+        self.HEIGHT = q_learning.HEIGHT
+        self.Q = {}
+        self.INIT_Q_VALUE = q_learning.INIT_Q_VALUE
+        self.agents = dict((self.cell(st), st) for st in q_learning.get_all_possible_states(shift=shift1))
+        self.partners = dict((self.cell(st), st) for st in q_learning.get_all_possible_states(shift=shift2))
+        # one shared, read-only default entry per agent cell; entry() copies it
+        self.defaults = dict((st, dict((action(), self.INIT_Q_VALUE) for action in q_learning.get_allowed_actions(st)))
+                             for st in self.agents.values())
+        # the same defaults as a (cells, 5) array, for to_array / from_array
+        self.default_rows = np.where(allowed_mask(q_learning, shift1), float(self.INIT_Q_VALUE), -np.inf)
+        self.created = 0
+        self.init_cells(q_learning, shift1, shift2)
+
+    def __len__(self):
+        return self.created
+
+    def to_array(self):
+        cells = self.WIDTH * self.HEIGHT
+        array = np.empty((cells, cells, len(ACTIONS)))
+        array[:] = self.default_rows[:, None, :]
+        for st1, partners in self.Q.items():
+            for st2, actions in partners.items():
+                array[self.cell(st1), self.cell(st2)] = -np.inf
+                for action, value in actions.items():
+                    array[self.cell(st1), self.cell(st2), ACTION_INDEX[action.movement]] = value
+        return array
+
+    def from_array(self, array):
+        # only entries that differ from the defaults are materialized, compared one agent cell at a time
+        self.Q = {}
+        self.created = 0
+        self.greedy = None
+        for c1, default in enumerate(self.default_rows):
+            for c2 in np.flatnonzero(np.any(array[c1] != default, axis=1)):
+                st1, st2 = self.agents[c1], self.partners[c2]
+                actions = self.entry(st1, st2)
+                for action in list(actions):
+                    value = array[c1, c2, ACTION_INDEX[action.movement]]
+                    if np.isfinite(value):
+                        actions[action] = float(value)
+                    else:
+                        del (actions[action])
+
+    def row(self, st1, st2):
+        partners = self.Q.get(st1)
+        if partners is not None and st2 in partners:
+            return partners[st2]
+        return self.defaults[st1]
+
+    def entry(self, st1, st2):
+        partners = self.Q.setdefault(st1, {})
+        if st2 not in partners:
+            partners[st2] = dict(self.defaults[st1])
+            self.created += 1
+        return partners[st2]
+
+
+class TensorQTable:
+    """
+        Q[agent_cell, partner_cell, action] stored in a preallocated (cells, cells, 5) array,
+        cell = y * WIDTH + x, action = index in ACTIONS.
+        Disallowed (or dangerous) actions are masked out and hold -inf, so a plain max is the max Q.
+        Max / argmax per joint state are cached and kept current on every write (see MaxCache).
+        value / max_value also accept arrays of cells and actions, see write_many.
+    """
+    vectorized = True
+
+    def __init__(self, q_learning, shift1, shift2):
+        self.WIDTH = q_learning.WIDTH
+        cells = self.WIDTH * q_learning.HEIGHT
+
+        agent_mask = q_learning.env.agent(shift1).mask
+        self.mask = np.repeat(agent_mask[:, None, :], cells, axis=1)
+        self.Q = np.where(self.mask, float(q_learning.INIT_Q_VALUE), -np.inf)
+        self.cache = MaxCache(self.Q)
+
+    def __len__(self):
+        return self.mask.shape[0] * self.mask.shape[1]
+
+    def cell(self, state):
+        return state.y * self.WIDTH + state.x
+
+    def to_array(self):
+        return self.Q
+
+    def from_array(self, array):
+        # a read-only memory map is kept as is, for serving a frozen policy
+        self.Q = array
+        self.mask = np.isfinite(array)
+        self.cache.rebuild(self.Q)
+
+    def index(self, st1, st2, action):
+        return st1.y * self.WIDTH + st1.x, st2.y * self.WIDTH + st2.x, ACTION_INDEX[action.movement]
+
+    @staticmethod
+    def to_state(state, action_idx):
+        move = getattr(state, 'move_' + ACTIONS[action_idx])
+        return move()
+
+    def get(self, st1, st2, action):
+        return self.Q[self.index(st1, st2, action)]
+
+    def set(self, st1, st2, action, value):
+        c1, c2, a = self.index(st1, st2, action)
+        self.cache.write((c1, c2), a, value)
+
+    def remove(self, st1, st2, action):
+        c1, c2, a = self.index(st1, st2, action)
+        self.mask[c1, c2, a] = False
+        self.cache.write((c1, c2), a, -np.inf)
+
+    def actions(self, st1, st2):
+        c1, c2 = self.cell(st1), self.cell(st2)
+        row = self.Q[c1, c2]
+        return [(self.to_state(st1, a), row[a]) for a in np.flatnonzero(self.mask[c1, c2])]
+
+    def get_max_q(self, st1, st2):
+        return self.cache.max_q[st1.y * self.WIDTH + st1.x, st2.y * self.WIDTH + st2.x]
+
+    def choose_action(self, st1, st2, epsilon, randomly=True):
+        c1, c2 = self.cell(st1), self.cell(st2)
+        if randomly and random.random() < epsilon:
+            return self.to_state(st1, random.choice(np.flatnonzero(self.mask[c1, c2])))
+        best = self.cache.best_actions((c1, c2))
+        if len(best) > 1:
+            return self.to_state(st1, random.choice(best))
+        return self.to_state(st1, best[0])
+
+    def value(self, c1, c2, action):
+        return self.Q[c1, c2, action]
+
+    def write(self, c1, c2, action, value):
+        self.cache.write((c1, c2), action, value)
+
+    def write_many(self, c1, c2, actions, values):
+        self.Q[c1, c2, actions] = values
+        self.cache.refresh((c1, c2))
+
+    def has_action(self, c1, c2, action):
+        return self.mask[c1, c2, action]
+
+    def remove_action(self, c1, c2, action):
+        self.mask[c1, c2, action] = False
+        self.cache.write((c1, c2), action, -np.inf)
+
+    def max_value(self, c1, c2):
+        return self.cache.max_q[c1, c2]
+
+    def best_action(self, c1, c2):
+        """ First action at the max in ACTIONS order """
+        return int(self.Q[c1, c2].argmax())
+
+    def argmax(self):
+        """ Greedy action index per (agent cell, partner cell), kept current by the cache """
+        return self.cache.argmax.copy()
+
+    def choose(self, c1, c2, epsilon, randomly=True):
+        if randomly and random.random() < epsilon:
+            return random.choice(np.flatnonzero(self.mask[c1, c2]))
+        best = self.cache.best_actions((c1, c2))
+        if len(best) > 1:
+            return random.choice(best)
+        return best[0]
+
+
+Q_TABLES = {
+    'dict': DictQTable,
+    'lazy': LazyQTable,
+    'tensor': TensorQTable,
+}
@@ -0,0 +1,80 @@
+import numpy as np
+
+
+class RewardEngine:
+    """
+        Rewards of joint transitions (st1, st2) -> (act1, act2) given as cells, cell = y * WIDTH + x.
+        ROOM is flattened into death / won arrays and distances are compared squared with MAX_DISTANCE ** 2.
+
+        An agent dies on a DEATH cell, or when the agents end up too far apart and it is also too far from
+        where its partner was. Any death fails the transition, otherwise a WIN cell wins it for both.
+        step() takes one transition as ints (cheapest for the training loop), batch() arrays of them.
+    """
+
+    def __init__(self, death, won, width, max_distance=3, walk=-0.1, death_reward=-100, win_reward=100):
+        self.death = np.asarray(death, dtype=bool)
+        self.won = np.asarray(won, dtype=bool)
+        self.WIDTH = width
+        self.max_distance = max_distance
+        self.limit = max_distance * max_distance
+        self.walk = walk
+        self.death_reward = death_reward
+        self.win_reward = win_reward
+
+        cells = np.arange(len(self.death))
+        self.xs = cells % width
+        self.ys = cells // width
+        # plain lists for step()
+        self._death = self.death.tolist()
+        self._won = self.won.tolist()
+        self._xs = self.xs.tolist()
+        self._ys = self.ys.tolist()
+
+    @classmethod
+    def from_q(cls, q_learning):
+        room = np.asarray(q_learning.ROOM).ravel()
+        return cls(room == q_learning.DEATH, room == q_learning.WIN, q_learning.WIDTH, q_learning.MAX_DISTANCE,
+                   q_learning.WALK_REWARDS, q_learning.DEATH, q_learning.WIN)
+
+    def distance2(self, a, b):
+        dx = self.xs[a] - self.xs[b]
+        dy = self.ys[a] - self.ys[b]
+        return dx * dx + dy * dy
+
+    def batch(self, act1, act2, st1, st2):
+        """ (r1, r2, failed, won) arrays for arrays of transitions """
+        act1, act2, st1, st2 = np.asarray(act1), np.asarray(act2), np.asarray(st1), np.asarray(st2)
+        too_far = self.distance2(act1, act2) > self.limit
+        die1 = self.death[act1] | (too_far & (self.distance2(act1, st2) > self.limit))
+        die2 = self.death[act2] | (too_far & (self.distance2(act2, st1) > self.limit))
+        win = self.won[act1] | self.won[act2]
+        base = np.where(win, float(self.win_reward), float(self.walk))
+        r1 = np.where(die1, float(self.death_reward), base)
+        r2 = np.where(die2, float(self.death_reward), base)
+        failed = die1 | die2
+        return r1, r2, failed, win & ~failed
+
+    def step(self, act1, act2, st1, st2):
+        """ batch() for one transition of ints, returns (r1, r2, failed, won) """
+        xs, ys, limit = self._xs, self._ys, self.limit
+        r1 = r2 = self.walk
+        win = self._won[act1] or self._won[act2]
+        if win:
+            r1 = r2 = self.win_reward
+
+        x1, y1, x2, y2 = xs[act1], ys[act1], xs[act2], ys[act2]
+        too_far = (x1 - x2) * (x1 - x2) + (y1 - y2) * (y1 - y2) > limit
+        die1 = self._death[act1]
+        die2 = self._death[act2]
+        if too_far:
+            dx, dy = x1 - xs[st2], y1 - ys[st2]
+            die1 = die1 or dx * dx + dy * dy > limit
+            dx, dy = x2 - xs[st1], y2 - ys[st1]
+            die2 = die2 or dx * dx + dy * dy > limit
+
+        if die1:
+            r1 = self.death_reward
+        if die2:
+            r2 = self.death_reward
+        failed = die1 or die2
+        return r1, r2, failed, win and not failed
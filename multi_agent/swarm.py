@@ -0,0 +1,160 @@
+import time
+
+import numpy as np
+
+from common.throughput import Throughput
+from multi_agent.env import Environment
+
+
+class SwarmTrainer(Throughput):
+    """
+        N agents in the ROOM world. Agent i learns Q[table[i], cell, observation, action], where the observation
+        is the offset of its nearest neighbour if it is within MAX_DISTANCE, or one extra value for nobody in range.
+        So the tables grow linearly with the number of agents instead of as cells ** N like the joint ones.
+        shared=True gives agents with the same shift one table.
+        Moves, rewards and updates of all agents are computed together with NumPy.
+
+        The rules of the two agent training: an agent dies on a DEATH cell, or when after the step it is farther
+        than MAX_DISTANCE from every other agent's new and old position. A death fails the episode for all,
+        otherwise an agent reaching WIN wins it for all. As in QLearning.mark_danger_states, an action that got
+        an agent killed is removed for its (cell, observation).
+    """
+
+    lanes = ('Agents', 'n_agents')
+
+    def __init__(self, q_learning, agents, shared=False, seed=None):
+        self.q_learning = q_learning
+        if q_learning.env is None:
+            q_learning.env = Environment(q_learning)
+        env = q_learning.env
+        self.rng = np.random.default_rng(seed)
+        self.n_agents = len(agents)
+
+        shifts = np.array([agent.shift for agent in agents])
+        if shared:
+            shifts, self.table = np.unique(shifts, return_inverse=True)
+        else:
+            self.table = np.arange(self.n_agents)
+        models = [env.agent(int(shift)) for shift in shifts]
+        self.next_cell = np.stack([model.next_cell for model in models])
+
+        self.radius = int(q_learning.MAX_DISTANCE)
+        self.side = 2 * self.radius + 1
+        self.alone = self.side * self.side
+        # mask[table, cell, observation, action]
+        self.mask = np.repeat(np.stack([model.mask for model in models])[:, :, None, :], self.alone + 1, axis=2)
+        self.Q = np.where(self.mask, float(q_learning.INIT_Q_VALUE), -np.inf)
+
+        self.xs = np.array(env.xs)
+        self.ys = np.array(env.ys)
+        self.death = np.asarray(env.death)
+        self.win = np.asarray(env.win)
+        self.starts = np.array([env.cell(agent) for agent in agents])
+        unsafe = [str(agent) for agent, cell in zip(agents, self.starts) if self.death[cell] or self.win[cell]]
+        if unsafe:
+            raise ValueError("agents start on DEATH or WIN cells: %s" % ', '.join(unsafe))
+        self.agents = np.arange(self.n_agents)
+
+        self.steps = 0
+        self.elapsed = 0.
+
+    def distance2(self, a, b):
+        """ Squared distances between the cells a[i] and b[j], inf for i == j """
+        dx = self.xs[b][None, :] - self.xs[a][:, None]
+        dy = self.ys[b][None, :] - self.ys[a][:, None]
+        d2 = (dx * dx + dy * dy).astype(float)
+        np.fill_diagonal(d2, np.inf)
+        return d2
+
+    def observe(self, cells):
+        d2 = self.distance2(cells, cells)
+        nearest = d2.argmin(axis=1)
+        dx = self.xs[cells[nearest]] - self.xs[cells]
+        dy = self.ys[cells[nearest]] - self.ys[cells]
+        obs = (dy + self.radius) * self.side + dx + self.radius
+        return np.where(d2[self.agents, nearest] <= self.radius * self.radius, obs, self.alone)
+
+    def choose_actions(self, cells, obs, randomly=True):
+        q = self.Q[self.table, cells, obs]
+        best = q == q.max(axis=1, keepdims=True)
+        if randomly:
+            explore = self.rng.random(self.n_agents) < self.q_learning.EPSILON
+            candidates = np.where(explore[:, None], self.mask[self.table, cells, obs], best)
+        else:
+            candidates = best
+        # random tie break between candidates
+        return np.argmax(np.where(candidates, self.rng.random(q.shape), -1.), axis=1)
+
+    def outcomes(self, cells, next_cells):
+        """ (died per agent, won) of moving all agents from cells to next_cells """
+        limit = self.radius * self.radius
+        died = self.death[next_cells].copy()
+        if self.n_agents > 1:
+            died |= ((self.distance2(next_cells, next_cells).min(axis=1) > limit) &
+                     (self.distance2(next_cells, cells).min(axis=1) > limit))
+        return died, bool(self.win[next_cells].any())
+
+    def mark_danger_states(self, index, died):
+        # the last action of an observation is kept, so the max Q of a state never becomes -inf
+        for i in np.flatnonzero(died):
+            t, c, o, a = (int(part[i]) for part in index)
+            if self.mask[t, c, o].sum() > 1:
+                self.mask[t, c, o, a] = False
+                self.Q[t, c, o, a] = -np.inf
+
+    def training(self):
+        ql = self.q_learning
+        Q = self.Q
+        alpha = pow(max(ql.tick - 1, 1), -ql.ALPHA_DECAY)
+        cells = self.starts.copy()
+        obs = self.observe(cells)
+        started = time.time()
+
+        while ql.failures < ql.MAX_ITERATIONS and ql.success < ql.EPOCHS:
+            actions = self.choose_actions(cells, obs)
+            next_cells = self.next_cell[self.table, cells, actions]
+            died, won = self.outcomes(cells, next_cells)
+
+            rewards = np.full(self.n_agents, ql.WIN if won else ql.WALK_REWARDS, dtype=float)
+            rewards[died] = ql.DEATH
+
+            next_obs = self.observe(next_cells)
+            index = (self.table, cells, obs, actions)
+            q = Q[index]
+            Q[index] = q + alpha * (rewards + ql.GAMMA * Q[self.table, next_cells, next_obs].max(axis=1) - q)
+
+            if died.any():
+                self.mark_danger_states(index, died)
+                ql.failures += 1
+                cells = self.starts.copy()
+                obs = self.observe(cells)
+            elif won:
+                ql.success += 1
+                cells = self.starts.copy()
+                obs = self.observe(cells)
+            else:
+                cells, obs = next_cells, next_obs
+
+            alpha = pow(ql.tick, -ql.ALPHA_DECAY)
+            ql.tick += 1
+            self.steps += 1
+
+        if ql.success >= ql.EPOCHS:
+            ql.stop_reason = 'epochs: %d successes' % ql.success
+        else:
+            ql.stop_reason = 'max iterations: %d failures' % ql.failures
+        self.elapsed += time.time() - started
+
+    def rollout(self, max_steps=1000):
+        """ Steps until the greedy swarm wins from the start cells, -1 when it fails or runs out of steps """
+        cells = self.starts.copy()
+        for step in range(1, max_steps + 1):
+            actions = self.choose_actions(cells, self.observe(cells), randomly=False)
+            next_cells = self.next_cell[self.table, cells, actions]
+            died, won = self.outcomes(cells, next_cells)
+            if died.any():
+                return -1
+            if won:
+                return step
+            cells = next_cells
+        return -1
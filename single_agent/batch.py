@@ -0,0 +1,71 @@
+import time
+
+import numpy as np
+
+from common.throughput import Throughput
+
+
+class BatchTrainer(Throughput):
+    """
+        Runs N independent episodes of the ROOM world in lock-step.
+        All episodes share (and update) one DenseQTable.
+    """
+
+    def __init__(self, q_learning, n_envs=64, seed=None):
+        if not hasattr(q_learning.Q, 'mask'):
+            raise ValueError("Batch training needs the 'dense' Q table")
+        self.q_learning = q_learning
+        self.table = q_learning.Q
+        self.n_envs = n_envs
+        self.rng = np.random.default_rng(seed)
+
+        self.next_cell = q_learning.env.next_cell
+
+        room = q_learning.env.room
+        self.failed = room == -100
+        self.won = room == 100
+
+        self.steps = 0
+        self.elapsed = 0.
+
+    def choose_actions(self, cells, randomly=True):
+        q = self.table.Q[cells]
+        best = q == q.max(axis=1, keepdims=True)
+        if randomly:
+            explore = self.rng.random(len(cells)) < self.q_learning.EPSILON
+            candidates = np.where(explore[:, None], self.table.mask[cells], best)
+        else:
+            candidates = best
+        # random tie break between candidates
+        return np.argmax(np.where(candidates, self.rng.random(q.shape), -1.), axis=1)
+
+    def training(self, start_state):
+        ql = self.q_learning
+        Q = self.table.Q
+        start = self.table.cell(start_state.pos_x, start_state.pos_y)
+        cells = np.full(self.n_envs, start)
+        # the learning rate follows ql.tick like training(), one tick per transition
+        alpha = pow(max(ql.tick - 1, 1), -ql.ALPHA_DECAY)
+        started = time.time()
+
+        while ql.success < ql.EPOCHS:
+            actions = self.choose_actions(cells)
+            next_cells = self.next_cell[cells, actions]
+
+            failed = self.failed[next_cells]
+            won = self.won[next_cells]
+            rewards = np.where(failed, -100., np.where(won, 100., ql.WALK_REWARDS))
+
+            q = Q[cells, actions]
+            Q[cells, actions] = q + alpha * (rewards + ql.GAMMA * Q[next_cells].max(axis=1) - q)
+
+            ql.failures += int(failed.sum())
+            ql.success += int(won.sum())
+            cells = np.where(failed | won, start, next_cells)
+
+            alpha = pow(ql.tick, -ql.ALPHA_DECAY)
+            ql.tick += self.n_envs
+            self.steps += self.n_envs
+
+        self.table.rebuild()
+        self.elapsed += time.time() - started
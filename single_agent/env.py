@@ -0,0 +1,45 @@
+import numpy as np
+
+from single_agent.q_table import ACTION_INDEX, ACTIONS, next_cells
+
+try:
+    xrange
+except NameError:
+    xrange = range
+
+
+class Environment:
+    """
+        The ROOM world compiled once into integer tables, so training allocates nothing per step.
+        cell = y * WIDTH + x, action = index in ACTIONS.
+
+        next_state[cell][action] - cell the action leads to (only for allowed actions)
+        allowed[cell] - allowed action indexes, allowed_bits[cell] - the same as a bitmask
+        failed[cell] / won[cell] - stepping there ends the episode
+        states[cell] - one State per cell, used as a key by dict Q tables and for rendering
+    """
+
+    def __init__(self, q_learning):
+        self.WIDTH = q_learning.WIDTH
+        self.HEIGHT = q_learning.HEIGHT
+        self.cells = self.WIDTH * self.HEIGHT
+
+        self.states = [q_learning.make_state(cell % self.WIDTH, cell // self.WIDTH) for cell in xrange(self.cells)]
+        self.mask = np.zeros((self.cells, len(ACTIONS)), dtype=bool)
+        for cell, state in enumerate(self.states):
+            for action in q_learning.get_allowed_actions(state):
+                self.mask[cell, ACTION_INDEX[action().action]] = True
+
+        self.next_cell = next_cells(self.WIDTH, self.HEIGHT, self.mask)
+        self.allowed_bits = (self.mask * (1 << np.arange(len(ACTIONS)))).sum(axis=1)
+
+        room = np.asarray(q_learning.ROOM).ravel()
+        self.room = room
+        # plain lists: indexing them with Python ints is what the scalar training loop does every step
+        self.next_state = self.next_cell.tolist()
+        self.allowed = [np.flatnonzero(row).tolist() for row in self.mask]
+        self.failed = (room == -100).tolist()
+        self.won = (room == 100).tolist()
+
+    def cell(self, state):
+        return state.pos_y * self.WIDTH + state.pos_x
@@ -1,20 +1,56 @@
 #!/usr/bin/env python
 from __future__ import print_function
-import random
 import time
 import os
+import sys
+import numpy as np
 # import matplotlib.pyplot as plt
 
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from common import checkpoint, maps
+from common.trajectory import TrajectoryWriter
+from common.replay import ReplayBuffer
+from common.statistics import Statistics
+from single_agent.policy import Policy
+from single_agent.q_table import ACTIONS, Q_TABLES
+from single_agent.solver import value_iteration
+from single_agent.batch import BatchTrainer
+from single_agent.env import Environment
+from single_agent.parallel import ParallelTrainer
+
 try:
     xrange
 except NameError:
     xrange = range
 
-class State:
-    def __init__(self, pos_x=0, pos_y=0, action=''):
-        self.pos_x = pos_x
-        self.pos_y = pos_y
-        self.action = action
+class State(object):
+    """
+        Immutable and interned: there is one State per (pos_x, pos_y, action), so the many dict keys
+        and moves that refer to the same cell share an object. Equality and hash ignore the action.
+    """
+    __slots__ = ('pos_x', 'pos_y', 'action', '_hash')
+    _instances = {}
+
+    def __new__(cls, pos_x=0, pos_y=0, action=''):
+        key = (pos_x, pos_y, action)
+        state = cls._instances.get(key)
+        if state is None:
+            state = object.__new__(cls)
+            object.__setattr__(state, 'pos_x', pos_x)
+            object.__setattr__(state, 'pos_y', pos_y)
+            object.__setattr__(state, 'action', action)
+            object.__setattr__(state, '_hash', hash((pos_x, pos_y)))
+            cls._instances[key] = state
+        return state
+
+    def __setattr__(self, name, value):
+        raise AttributeError("State is immutable")
+
+    def __reduce__(self):
+        return State, (self.pos_x, self.pos_y, self.action)
 
     def move_left(self):
         return State(self.pos_x - 1, self.pos_y, 'left')
@@ -29,10 +65,10 @@ class State:
         return State(self.pos_x, self.pos_y + 1, 'bottom')
 
     def __hash__(self):
-        return hash((self.pos_x, self.pos_y))
+        return self._hash
 
     def __eq__(self, other):
-        return (self.pos_x, self.pos_y) == (other.pos_x, other.pos_y)
+        return self is other or (self.pos_x, self.pos_y) == (other.pos_x, other.pos_y)
 
     def __ne__(self, other):
         return not (self == other)
@@ -42,18 +78,47 @@ class State:
 
 
 class QLearning:
-    def __init__(self):
+    # methods timed by common.profiler.Profiler, phase -> [(attribute holding the method, '' for self, method)]
+    PROFILE_PHASES = {
+        'choose_next_action': [('', 'next_move')],
+        'get_max_q': [('Q', 'max_value')],
+        'get_updated_q': [('', 'get_updated_q')],
+        'statistics': [('statistics', 'append')],
+    }
+
+    def __init__(self, q_table='dict', headless=False, progress=None, room=None, statistics_path=None):
         self.GAMMA = .8
         self.EPSILON = 0.2
         self.EPOCHS = 100
         self.INIT_Q_VALUE = 0  # in most cases should be zero
         self.FRAME_RATE = 0.15
         self.WALK_REWARDS = -0.1  # IMPORTANT TO HAVE IT IN RANGE -0.3 .. 0
-        self.Q = {}
+        self.ALPHA_DECAY = 0.1
+        self.Q_TABLE = q_table
+        # headless: no terminal rendering or per-tick statistics at all
+        # progress: when to print statistics while training (common.progress.Progress), off by default or False
+        self.headless = headless
+        if headless or progress is False:
+            self.progress = None
+        else:
+            self.progress = progress
+        self.Q = None
 
         self.success = 0
         self.failures = 0
-        self.statistics = {'Q': [], 'rewards': [], 'iter': []}
+        self.tick = 1
+        # optional common.convergence.Convergence, stops training early
+        self.convergence = None
+        self.stop_reason = None
+        # optional common.replay.ReplayBuffer, a minibatch is replayed after every step (see use_replay)
+        self.replay = None
+        # common.profiler.Profiler while one is attached
+        self.profiler = None
+        # common.trajectory.TrajectoryWriter logging every step, see record()
+        self.recorder = None
+        # dQ is |Q change| of the update, so its window mean is the mean |dQ|
+        # window means are appended to statistics_path as CSV when given, closed at the end of training()
+        self.statistics = Statistics(('Q', 'rewards', 'dQ'), path=statistics_path)
 
         self.ROOM = [
             [0, 0, 0, 0, 0, 0, -100, 0, 0, 0, 0, 0, 0, 0, 0, 0],
@@ -66,6 +131,9 @@ class QLearning:
             [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, -100, 0, 0],
             [0, 0, -100, -100, -100, -100, -100, -100, -100, -100, -100, -100, -100, -100, 0, 100]
         ]
+        # any other room, e.g. from common.maps
+        if room is not None:
+            self.ROOM = room
 
         self.HEIGHT = len(self.ROOM)
         self.WIDTH = len(self.ROOM[0])
@@ -73,14 +141,18 @@ class QLearning:
         self.init_q()
 
     def init_q(self):
-        for x in xrange(self.WIDTH):
-            for y in xrange(self.HEIGHT):
-                state = State(x, y)
-                actions = self.get_allowed_actions(state)
-                temp = {}
-                for action in actions:
-                    temp[action()] = self.INIT_Q_VALUE
-                self.Q[state] = temp
+        self.env = Environment(self)
+        self.Q = Q_TABLES[self.Q_TABLE](self)
+
+    def set_room(self, room):
+        """ Switches to another room, Q starts over """
+        self.ROOM = room
+        self.HEIGHT = len(room)
+        self.WIDTH = len(room[0])
+        self.init_q()
+
+    def make_state(self, x, y):
+        return State(x, y)
 
     def is_movable_to_the_left(self, state):
         return state.pos_x > 0
@@ -107,73 +179,159 @@ class QLearning:
         return allowed
 
     def choose_next_action(self, state, randomly=True):
-        allowed = list(self.Q[state].items())
-        if randomly and random.random() < self.EPSILON:
-            return random.choice(allowed)[0]
-        else:
-            q = [a[1] for a in allowed]
-            max_q = max(q)
-            count = q.count(max_q)
-            if count > 1:
-                best = [a for a in allowed if a[1] == max_q]
-                return random.choice(best)[0]
-            else:
-                return [a[0] for a in allowed if a[1] == max_q][0]
+        return self.Q.choose_action(state, self.EPSILON, randomly)
 
     def get_max_q(self, next_state):
-        allowed = self.Q[next_state].items()
-        max_v = -1000
-        for allowed_state in allowed:
-            if allowed_state[1] > max_v:
-                max_v = allowed_state[1]
-        return max_v
+        return self.Q.get_max_q(next_state)
 
-    def next_move(self, state):
-        return state, self.choose_next_action(state)
+    def next_move(self, cell):
+        return cell, self.Q.choose(cell, self.EPSILON)
 
     def training(self, start_state=State()):
-        count = 0
-        tick = 1
-        alpha = 1
-        state, action = self.next_move(start_state)
-        while count < self.EPOCHS:
+        # resumes the learning rate schedule when continuing from a checkpoint
+        alpha = pow(max(self.tick - 1, 1), -self.ALPHA_DECAY)
+        # the loop works on integer cells / action indexes of the compiled environment
+        env = self.env
+        start = env.cell(start_state)
+        state, action = self.next_move(start)
+        episode, step = self.success + self.failures, 0
+        while self.success < self.EPOCHS:
 
             reward = self.WALK_REWARDS
+            next_state = env.next_state[state][action]
 
-            # self.show_progress(state, action)
-
-            old_state = state
-            old_action = action
+            # self.show_progress(env.states[state], env.states[next_state])
 
-            if self.is_game_failed(action):
+            done = True
+            if env.failed[next_state]:
                 reward = -100
                 self.failures += 1
-                next_action = start_state
-            elif self.is_game_won(action):
+                following = start
+            elif env.won[next_state]:
                 reward = 100
                 self.success += 1
-                count += 1
-                next_action = start_state
+                following = start
             else:
-                next_action = action
+                following = next_state
+                done = False
 
-            updated_q = self.get_updated_q(old_state, old_action, alpha, reward, action)
+            old_q = self.Q.value(state, action)
+            updated_q = self.get_updated_q(state, action, alpha, reward, next_state)
 
-            self.Q[old_state][old_action] = updated_q
+            self.Q.write(state, action, updated_q)
+
+            if self.recorder is not None:
+                self.recorder.append(episode, step, state, action, reward, updated_q)
+            if done:
+                episode, step = episode + 1, 0
+            else:
+                step += 1
 
-            state, action = self.next_move(next_action)
+            if self.replay is not None:
+                self.replay.add(state, action, reward, next_state, done)
+                if self.replay.ready():
+                    self.replay_batch(alpha)
+
+            state, action = self.next_move(following)
 
             # Update the learning rate
-            alpha = pow(tick, -0.1)
-            tick += 1
+            alpha = pow(self.tick, -self.ALPHA_DECAY)
+            self.tick += 1
+
+            if self.progress is not None and self.progress.ready(self.tick):
+                self.show_statistics()
+
+            self.statistics.append(self.tick, updated_q, reward, abs(updated_q - old_q))
+
+            if self.profiler is not None:
+                self.profiler.step(self.tick)
 
-            self.statistics["Q"].append(updated_q)
-            self.statistics["rewards"].append(reward)
-            self.statistics["iter"].append(tick)
+            if self.convergence is not None and \
+                    self.convergence.step(self.tick, abs(updated_q - old_q), self.greedy_actions):
+                self.stop_reason = self.convergence.reason
+                break
+        else:
+            self.stop_reason = 'epochs: %d successes' % self.success
+
+        if self.recorder is not None:
+            self.recorder.flush()
+        self.statistics.close()
+
+    def training_batch(self, start_state=State(), n_envs=64, seed=None):
+        trainer = BatchTrainer(self, n_envs, seed)
+        trainer.training(start_state)
+        if not self.headless:
+            trainer.show_statistics()
+        return trainer
+
+    def training_parallel(self, start_state=State(), workers=None, seed=None, **kwargs):
+        trainer = ParallelTrainer(self, workers, seed, **kwargs)
+        trainer.training(start_state)
+        if not self.headless:
+            trainer.show_statistics()
+        return trainer
+
+    def use_replay(self, capacity=10000, batch_size=32, prioritized=False, seed=None):
+        self.replay = ReplayBuffer(capacity, batch_size, 1, prioritized, seed=seed)
+        return self.replay
+
+    def replay_batch(self, alpha):
+        """ Re-applies get_updated_q to a sampled minibatch, in one shot on the dense table """
+        idx, (state,), action, reward, (next_state,), _ = self.replay.sample()
+        if self.Q.vectorized:
+            old_q = self.Q.value(state, action)
+            updated_q = self.get_updated_q(state, action, alpha, reward, next_state)
+            self.Q.write_many(state, action, updated_q)
+        else:
+            old_q = np.empty(len(idx))
+            updated_q = np.empty(len(idx))
+            for i in xrange(len(idx)):
+                s, a = state[i], action[i]
+                old_q[i] = self.Q.value(s, a)
+                updated_q[i] = self.get_updated_q(s, a, alpha, reward[i], next_state[i])
+                self.Q.write(s, a, updated_q[i])
+        self.replay.update_priorities(idx, updated_q - old_q)
+
+    def record(self, path, chunk_size=65536):
+        """ Logs every training step to path (common.trajectory), state = y * WIDTH + x; close() when done """
+        self.recorder = TrajectoryWriter(path, chunk_size, program='single_agent', actions=ACTIONS,
+                                         state_index='y * WIDTH + x', WIDTH=self.WIDTH, HEIGHT=self.HEIGHT)
+        return self.recorder
+
+    def solve(self, tol=1e-9):
+        """ Fills Q with the optimal values of the known ROOM model instead of training """
+        q, iterations = value_iteration(self, tol)
+        self.Q.from_array(q)
+        return iterations
+
+    def greedy_actions(self):
+        return np.argmax(self.Q.to_array(), axis=1)
+
+    def compile_policy(self):
+        return Policy.from_q(self)
+
+    def save(self, path):
+        checkpoint.save(path, self.Q.to_array(),
+                        program='single_agent', q_table=self.Q_TABLE,
+                        state_index='y * WIDTH + x', actions=ACTIONS, WIDTH=self.WIDTH, HEIGHT=self.HEIGHT,
+                        tick=self.tick, success=self.success, failures=self.failures,
+                        GAMMA=self.GAMMA, EPSILON=self.EPSILON, WALK_REWARDS=self.WALK_REWARDS,
+                        ALPHA_DECAY=self.ALPHA_DECAY)
+
+    def load(self, path, mmap=False):
+        array, header = checkpoint.load(path, mmap, program='single_agent')
+        if (header['WIDTH'], header['HEIGHT']) != (self.WIDTH, self.HEIGHT):
+            raise ValueError("%s was trained on a %dx%d room" % (path, header['WIDTH'], header['HEIGHT']))
+        self.Q.from_array(array)
+        self.tick = header['tick']
+        self.success = header['success']
+        self.failures = header['failures']
 
     def get_updated_q(self, state, action, alpha, r, next_state):
         #  Q[s',a'] = Q[s',a'] + alpha * (reward + gamma * MAX(Q,s) - Q[s',a'])
-        return self.Q[state][action] + alpha * (r + self.GAMMA * self.get_max_q(next_state) - self.Q[state][action])
+        #  state / next_state are cells, action an action index
+        q = self.Q.value(state, action)
+        return q + alpha * (r + self.GAMMA * self.Q.max_value(next_state) - q)
 
     def is_game_failed(self, action):
         return self.ROOM[action.pos_y][action.pos_x] == -100
@@ -182,11 +340,13 @@ class QLearning:
         return self.ROOM[action.pos_y][action.pos_x] == 100
 
     def show_progress(self, state, action):
+        if self.headless:
+            return
         os.system('cls' if os.name == 'nt' else 'clear')
         for i in xrange(self.HEIGHT):
             for j in xrange(self.WIDTH):
                 if action.pos_x == j and action.pos_y == i:
-                    print('\033[0;31;40m%6.2f' % self.Q[state][action], end='')
+                    print('\033[0;31;40m%6.2f' % self.Q.get(state, action), end='')
                 else:
                     if self.ROOM[i][j] == -100:
                         print('\033[1;32;40m%6s' % "x", end='')
@@ -197,35 +357,43 @@ class QLearning:
             print()
         print()
         print("\033[1;32;40mSuccess: %d, Failures: %d" % (self.success, self.failures))
-        # [print("%2.2f -- %s" % (i[1], i[0])) for i in self.Q[state].items()]
+        # [print("%2.2f -- %s" % (i[1], i[0])) for i in self.Q.actions(state)]
         time.sleep(self.FRAME_RATE)
 
-    def show_final_result(self, state):
-        steps = 0
-        while True:
+    def show_final_result(self, state, max_steps=None):
+        if max_steps is None:
+            max_steps = self.WIDTH * self.HEIGHT
+        for steps in xrange(max_steps):
             next_state = self.choose_next_action(state, False)
             self.show_progress(state, next_state)
             if self.is_game_won(next_state):
                 print("Steps: %d" % steps)
+                return
+            if self.is_game_failed(next_state):
                 break
             state = next_state
-            steps += 1
+        print("Goal not reached in %d steps" % (steps + 1))
+
+    def show_statistics(self):
+        sys.stdout.write('\rSuccess: %d, Failures: %d' % (self.success, self.failures))
+        sys.stdout.flush()
 
     # def show_graph(self):
+    #     stats = self.statistics.windows()
     #     plt.subplot(211)
-    #     plt.plot(self.statistics["iter"], self.statistics["Q"], lw=1)
+    #     plt.plot(stats["tick"], stats["Q"], lw=1)
     #     plt.title('Iter/Q')
     #
     #     plt.subplot(212)
-    #     plt.plot(self.statistics["iter"], self.statistics["rewards"], lw=1)
+    #     plt.plot(stats["tick"], stats["rewards"], lw=1)
     #     plt.title('Iter/Rewards')
     #     plt.show()
 
 
-def run():
-    q_learning = QLearning()
+def run(q_table='dict', headless=False, room=None):
+    q_learning = QLearning(q_table, headless, room=room)
 
-    s = State(0, 8)
+    s = State(0, q_learning.HEIGHT - 1)
 
     q_learning.training(s)
 
@@ -235,4 +403,5 @@ def run():
 
 
 if __name__ == '__main__':
-    run()
+    # main.py [q_table [map file]]
+    run(*sys.argv[1:2], room=maps.load(sys.argv[2]) if len(sys.argv) > 2 else None)
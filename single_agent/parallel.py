@@ -0,0 +1,151 @@
+import multiprocessing
+import random
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from common.throughput import Throughput
+
+# indexes into the shared counters
+SUCCESS, FAILURES, STEPS = 0, 1, 2
+
+
+def worker(shm_name, shape, env, params, seed, start, lock_stripes, counters, counters_lock):
+    """
+        One Hogwild learner: the serial training loop on integer cells, reading and writing
+        the shared Q array without locks (or under a per-cell-stripe lock when lock_stripes is set).
+    """
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        Q = np.ndarray(shape, dtype=np.float64, buffer=shm.buf)
+        rng = random.Random(seed)
+        next_state, allowed, failed, won = env['next_state'], env['allowed'], env['failed'], env['won']
+        starts = env['starts']
+        gamma, epsilon, walk, decay = params['GAMMA'], params['EPSILON'], params['WALK_REWARDS'], params['ALPHA_DECAY']
+        epochs = params['EPOCHS']
+
+        def choose(cell):
+            if rng.random() < epsilon:
+                return rng.choice(allowed[cell])
+            # a snapshot, other workers keep writing the shared row
+            row = Q[cell].tolist()
+            best = max(row)
+            return rng.choice([a for a in allowed[cell] if row[a] == best])
+
+        def episode_start():
+            return start if start is not None else rng.choice(starts)
+
+        tick = 1
+        alpha = 1
+        steps = 0
+        state = episode_start()
+        action = choose(state)
+        while counters[SUCCESS] < epochs:
+            following = None
+            reward = walk
+            n = next_state[state][action]
+            if failed[n]:
+                reward = -100
+                following = episode_start()
+            elif won[n]:
+                reward = 100
+                following = episode_start()
+
+            if lock_stripes:
+                with lock_stripes[state % len(lock_stripes)]:
+                    q = Q[state, action]
+                    Q[state, action] = q + alpha * (reward + gamma * max(Q[n].tolist()) - q)
+            else:
+                q = Q[state, action]
+                Q[state, action] = q + alpha * (reward + gamma * max(Q[n].tolist()) - q)
+
+            steps += 1
+            if following is not None:
+                with counters_lock:
+                    counters[SUCCESS if reward > 0 else FAILURES] += 1
+                    counters[STEPS] += steps
+                steps = 0
+                state = following
+            else:
+                state = n
+            action = choose(state)
+
+            alpha = pow(tick, -decay)
+            tick += 1
+
+        with counters_lock:
+            counters[STEPS] += steps
+    finally:
+        shm.close()
+
+
+class ParallelTrainer(Throughput):
+    """
+        Asynchronous (Hogwild-style) training of the single agent on several processes.
+        All workers update one Q array in multiprocessing.shared_memory, the result is copied
+        back into the QLearning's table. Training stops once the workers together reach EPOCHS successes.
+
+        random_starts - every episode starts in a random safe cell. start_state is then ignored and, to cover
+        every start, training runs until EPOCHS successes per safe cell (ql.success counts them all),
+        lock_stripes - guard updates with this many locks striped by cell (0 = lock-free).
+    """
+
+    lanes = ('Workers', 'workers')
+
+    def __init__(self, q_learning, workers=None, seed=None, random_starts=False, lock_stripes=0):
+        self.q_learning = q_learning
+        self.workers = workers or multiprocessing.cpu_count()
+        self.seed = seed if seed is not None else random.randrange(1 << 30)
+        self.random_starts = random_starts
+        self.lock_stripes = lock_stripes
+        self.steps = 0
+        self.elapsed = 0.
+
+    def training(self, start_state):
+        ql = self.q_learning
+        env = ql.env
+        initial = np.ascontiguousarray(ql.Q.to_array(), dtype=np.float64)
+
+        shm = shared_memory.SharedMemory(create=True, size=initial.nbytes)
+        try:
+            Q = np.ndarray(initial.shape, dtype=np.float64, buffer=shm.buf)
+            Q[:] = initial
+
+            safe = [cell for cell in range(env.cells) if not (env.failed[cell] or env.won[cell])]
+            shared_env = {'next_state': env.next_state, 'allowed': env.allowed,
+                          'failed': env.failed, 'won': env.won, 'starts': safe}
+            params = dict((name, getattr(ql, name))
+                          for name in ('GAMMA', 'EPSILON', 'WALK_REWARDS', 'ALPHA_DECAY', 'EPOCHS'))
+            start = None if self.random_starts else env.cell(start_state)
+            if self.random_starts:
+                params['EPOCHS'] *= len(safe)
+
+            counters = multiprocessing.Array('q', 3, lock=False)
+            counters[SUCCESS] = ql.success
+            counters_lock = multiprocessing.Lock()
+            stripes = [multiprocessing.Lock() for _ in range(self.lock_stripes)]
+
+            processes = [multiprocessing.Process(target=worker, args=(
+                shm.name, initial.shape, shared_env, params, self.seed + i, start, stripes, counters, counters_lock))
+                for i in range(self.workers)]
+
+            started = time.time()
+            for process in processes:
+                process.start()
+            for process in processes:
+                process.join()
+            self.elapsed += time.time() - started
+
+            for process in processes:
+                if process.exitcode:
+                    raise RuntimeError("Training worker exited with code %d" % process.exitcode)
+
+            ql.Q.from_array(Q.copy())
+            ql.success = counters[SUCCESS]
+            ql.failures += counters[FAILURES]
+            ql.tick += counters[STEPS]
+            self.steps += counters[STEPS]
+        finally:
+            shm.close()
+            shm.unlink()
@@ -0,0 +1,91 @@
+import numpy as np
+
+from single_agent.q_table import ACTIONS, next_cells
+
+
+class Policy:
+    """
+        Frozen greedy policy: actions[cell] = argmax Q[cell] plus the next_cell table, so serving
+        needs no Q table and no State objects. cell = y * WIDTH + x.
+        Ties go to the first action in ACTIONS order (training breaks them randomly).
+    """
+
+    def __init__(self, actions, next_cell, won, failed, width):
+        self.actions = actions
+        self.next_cell = next_cell
+        self.won = won
+        self.failed = failed
+        self.WIDTH = width
+
+    @classmethod
+    def from_q(cls, q_learning):
+        q = np.asarray(q_learning.Q.to_array())
+        room = np.asarray(q_learning.ROOM).ravel()
+        return cls(np.argmax(q, axis=1),
+                   next_cells(q_learning.WIDTH, q_learning.HEIGHT, np.isfinite(q)),
+                   room == 100, room == -100, q_learning.WIDTH)
+
+    def cell(self, state):
+        if isinstance(state, (int, np.integer)):
+            return state
+        return state.pos_y * self.WIDTH + state.pos_x
+
+    def act(self, state):
+        """ Greedy action index (see ACTIONS) for a State or a cell """
+        return self.actions[self.cell(state)]
+
+    def action_name(self, state):
+        return ACTIONS[self.act(state)]
+
+    def step(self, cells):
+        cells = np.asarray(cells)
+        return self.next_cell[cells, self.actions[cells]]
+
+    def rollout(self, start_cells, max_steps=None):
+        """
+            Follows the policy from many start cells at once.
+            Returns steps to the goal per start cell, -1 where it fails or never gets there.
+        """
+        cells = np.array(start_cells, copy=True)
+        if max_steps is None:
+            max_steps = len(self.actions)
+        steps = np.full(len(cells), -1)
+        active = ~(self.won[cells] | self.failed[cells])
+        steps[self.won[cells]] = 0
+        for step in range(1, max_steps + 1):
+            if not active.any():
+                break
+            cells = np.where(active, self.step(cells), cells)
+            done = active & self.won[cells]
+            steps[done] = step
+            active &= ~(self.won[cells] | self.failed[cells])
+        return steps
+
+    def path(self, state, max_steps=None):
+        """
+            Cells [c, ...] from the start until the agent wins, fails, comes back to a cell or runs out of steps.
+            Returns (path, won).
+        """
+        cell = int(self.cell(state))
+        path = [cell]
+        seen = set(path)
+        if max_steps is None:
+            max_steps = len(self.actions)
+        for _ in range(max_steps):
+            if self.won[cell] or self.failed[cell]:
+                break
+            cell = int(self.next_cell[cell, self.actions[cell]])
+            if cell in seen:
+                break
+            path.append(cell)
+            seen.add(cell)
+        return path, bool(self.won[cell])
+
+    def save(self, path):
+        np.savez(path, actions=self.actions, next_cell=self.next_cell, won=self.won, failed=self.failed,
+                 width=self.WIDTH)
+
+    @classmethod
+    def load(cls, path):
+        data = np.load(path)
+        return cls(data['actions'], data['next_cell'], data['won'], data['failed'], int(data['width']))
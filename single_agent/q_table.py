@@ -0,0 +1,209 @@
+import random
+
+import numpy as np
+
+try:
+    xrange
+except NameError:
+    xrange = range
+
+# Order matches QLearning.get_allowed_actions, so both tables walk actions identically
+ACTIONS = ('left', 'right', 'top', 'bottom')
+ACTION_INDEX = dict((name, idx) for idx, name in enumerate(ACTIONS))
+# (dx, dy) per ACTIONS entry
+ACTION_DELTAS = ((-1, 0), (1, 0), (0, -1), (0, 1))
+
+
+def next_cells(width, height, mask):
+    """ next_cell[cell, action] for every allowed action, disallowed ones stay in place """
+    deltas = np.array(ACTION_DELTAS)
+    cells = np.arange(width * height)
+    xs, ys = cells % width, cells // width
+    next_cell = (ys[:, None] + deltas[:, 1]) * width + (xs[:, None] + deltas[:, 0])
+    return np.where(mask, next_cell, cells[:, None])
+
+
+class DictQTable:
+    """ Q[state][next_state] = value, the original dict-of-dict layout """
+    # int API takes one cell at a time only
+    vectorized = False
+
+    def __init__(self, q_learning):
+        self.INIT_Q_VALUE = q_learning.INIT_Q_VALUE
+        self.WIDTH = q_learning.WIDTH
+        self.HEIGHT = q_learning.HEIGHT
+        self.Q = {}
+        for x in xrange(q_learning.WIDTH):
+            for y in xrange(q_learning.HEIGHT):
+                state = q_learning.make_state(x, y)
+                temp = {}
+                for action in q_learning.get_allowed_actions(state):
+                    temp[action()] = self.INIT_Q_VALUE
+                self.Q[state] = temp
+
+        # integer API: cells and action indexes map onto the same State keys
+        self.states = q_learning.env.states
+        self.next_state = q_learning.env.next_state
+
+    def to_array(self):
+        array = np.full((self.WIDTH * self.HEIGHT, len(ACTIONS)), -np.inf)
+        for state, actions in self.Q.items():
+            for action, value in actions.items():
+                array[state.pos_y * self.WIDTH + state.pos_x, ACTION_INDEX[action.action]] = value
+        return array
+
+    def from_array(self, array):
+        for state, actions in self.Q.items():
+            for action in actions:
+                actions[action] = float(array[state.pos_y * self.WIDTH + state.pos_x, ACTION_INDEX[action.action]])
+
+    def get(self, state, action):
+        return self.Q[state][action]
+
+    def set(self, state, action, value):
+        self.Q[state][action] = value
+
+    def actions(self, state):
+        return list(self.Q[state].items())
+
+    def get_max_q(self, state):
+        max_v = -1000
+        for value in self.Q[state].values():
+            if value > max_v:
+                max_v = value
+        return max_v
+
+    def choose_action(self, state, epsilon, randomly=True):
+        allowed = list(self.Q[state].items())
+        if randomly and random.random() < epsilon:
+            return random.choice(allowed)[0]
+        else:
+            q = [a[1] for a in allowed]
+            max_q = max(q)
+            count = q.count(max_q)
+            if count > 1:
+                best = [a for a in allowed if a[1] == max_q]
+                return random.choice(best)[0]
+            else:
+                return [a[0] for a in allowed if a[1] == max_q][0]
+
+    def value(self, cell, action):
+        return self.Q[self.states[cell]][self.states[self.next_state[cell][action]]]
+
+    def write(self, cell, action, value):
+        self.Q[self.states[cell]][self.states[self.next_state[cell][action]]] = value
+
+    def max_value(self, cell):
+        return self.get_max_q(self.states[cell])
+
+    def choose(self, cell, epsilon, randomly=True):
+        return ACTION_INDEX[self.choose_action(self.states[cell], epsilon, randomly).action]
+
+
+class DenseQTable:
+    """
+        Q[cell, action] stored in a preallocated (HEIGHT * WIDTH, 4) array,
+        cell = y * WIDTH + x, action = index in ACTIONS.
+        Disallowed actions are masked out and hold -inf, so a plain row max is the max Q.
+        The int API of the training loop reads a list view of Q (rows) and of the row maxima (max_q),
+        since indexing lists with ints is much cheaper than NumPy scalar indexing; writes go to both.
+        value / max_value also accept arrays of cells and actions, see write_many.
+    """
+    vectorized = True
+
+    def __init__(self, q_learning):
+        self.INIT_Q_VALUE = q_learning.INIT_Q_VALUE
+        self.WIDTH = q_learning.WIDTH
+        self.HEIGHT = q_learning.HEIGHT
+
+        self.mask = q_learning.env.mask
+        self.allowed = q_learning.env.allowed
+        self.Q = np.where(self.mask, float(self.INIT_Q_VALUE), -np.inf)
+        self.rebuild()
+
+    def to_array(self):
+        return self.Q
+
+    def from_array(self, array):
+        # a read-only memory map is kept as is, for serving a frozen policy
+        self.Q = array
+        self.rebuild()
+
+    def rebuild(self):
+        """ Call after writing Q directly (batch training) """
+        self.rows = self.Q.tolist()
+        self.max_q = [max(row) for row in self.rows]
+
+    def cell(self, x, y):
+        return y * self.WIDTH + x
+
+    def to_state(self, state, action_idx):
+        move = getattr(state, 'move_' + ACTIONS[action_idx])
+        return move()
+
+    def get(self, state, action):
+        return self.rows[self.cell(state.pos_x, state.pos_y)][ACTION_INDEX[action.action]]
+
+    def set(self, state, action, value):
+        self.write(self.cell(state.pos_x, state.pos_y), ACTION_INDEX[action.action], value)
+
+    def actions(self, state):
+        cell = self.cell(state.pos_x, state.pos_y)
+        row = self.rows[cell]
+        return [(self.to_state(state, a), row[a]) for a in self.allowed[cell]]
+
+    def get_max_q(self, state):
+        return self.max_q[self.cell(state.pos_x, state.pos_y)]
+
+    def choose_action(self, state, epsilon, randomly=True):
+        return self.to_state(state, self.choose(self.cell(state.pos_x, state.pos_y), epsilon, randomly))
+
+    def value(self, cell, action):
+        try:
+            return self.rows[cell][action]
+        except TypeError:
+            # arrays of cells and actions
+            return self.Q[cell, action]
+
+    def write(self, cell, action, value):
+        self.Q[cell, action] = value
+        row = self.rows[cell]
+        old = row[action]
+        row[action] = value
+        best = self.max_q[cell]
+        if value > best:
+            self.max_q[cell] = value
+        elif old == best and value < old:
+            self.max_q[cell] = max(row)
+
+    def write_many(self, cells, actions, values):
+        self.Q[cells, actions] = values
+        for cell in np.unique(cells).tolist():
+            row = self.rows[cell] = self.Q[cell].tolist()
+            self.max_q[cell] = max(row)
+
+    def max_value(self, cell):
+        try:
+            return self.max_q[cell]
+        except TypeError:
+            return self.Q[cell].max(axis=-1)
+
+    def best_actions(self, cell):
+        """ All actions at the max, in action order """
+        row = self.rows[cell]
+        best = self.max_q[cell]
+        return [a for a in self.allowed[cell] if row[a] == best]
+
+    def choose(self, cell, epsilon, randomly=True):
+        if randomly and random.random() < epsilon:
+            return random.choice(self.allowed[cell])
+        best = self.best_actions(cell)
+        if len(best) > 1:
+            return random.choice(best)
+        return best[0]
+
+
+Q_TABLES = {
+    'dict': DictQTable,
+    'dense': DenseQTable,
+}
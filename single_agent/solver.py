@@ -0,0 +1,34 @@
+import numpy as np
+
+
+def value_iteration(q_learning, tol=1e-9, max_iterations=10000):
+    """
+        Optimal Q of the ROOM model by vectorized value iteration, in the (HEIGHT * WIDTH, 4) layout
+        of DenseQTable.to_array(). Same rewards as training; failed and won cells end the episode.
+        Returns (Q, iterations).
+    """
+    mask = q_learning.env.mask
+    next_cell = q_learning.env.next_cell
+
+    room = q_learning.env.room
+    failed = room == -100
+    won = room == 100
+    terminal = failed | won
+
+    rewards = np.full(room.shape, float(q_learning.WALK_REWARDS))
+    rewards[failed] = -100.
+    rewards[won] = 100.
+    r = rewards[next_cell]
+
+    Q = np.where(mask, float(q_learning.INIT_Q_VALUE), -np.inf)
+    iterations = 0
+    while iterations < max_iterations:
+        iterations += 1
+        # terminal cells are never left, so they keep INIT_Q_VALUE, as in training
+        v = np.where(terminal, float(q_learning.INIT_Q_VALUE), Q.max(axis=1))
+        updated = np.where(mask, r + q_learning.GAMMA * v[next_cell], -np.inf)
+        delta = np.max(np.abs(updated[mask] - Q[mask]))
+        Q = updated
+        if delta < tol:
+            break
+    return Q, iterations
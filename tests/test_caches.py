@@ -0,0 +1,91 @@
+"""
+    Randomized checks of the incremental max / argmax caches against a full rescan.
+
+    $ python -m pytest tests
+"""
+import os
+import random
+import sys
+import unittest
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from common import maps
+from common.max_cache import MaxCache
+from five_rooms_problem.main import QLearning as FiveRooms
+from multi_agent.main import QLearning as MultiAgent, State
+
+# few distinct values, so writes often tie with or replace the max
+VALUES = (-1., 0., .5, 1.)
+
+
+class MaxCacheTest(unittest.TestCase):
+
+    def test_writes_and_removals(self):
+        rng = random.Random(0)
+        Q = np.array([[rng.choice(VALUES) for _ in range(5)] for _ in range(6)])
+        cache = MaxCache(Q)
+        for _ in range(5000):
+            value = -np.inf if rng.random() < .2 else rng.choice(VALUES)
+            cache.write((rng.randrange(6),), rng.randrange(5), value)
+            np.testing.assert_array_equal(cache.max_q, Q.max(axis=1))
+            np.testing.assert_array_equal(cache.argmax, Q.argmax(axis=1))
+            np.testing.assert_array_equal(cache.ties, np.count_nonzero(Q == Q.max(axis=1)[:, None], axis=1))
+
+
+class MultiAgentArgmaxTest(unittest.TestCase):
+
+    def check(self, q_table):
+        rng = random.Random(1)
+        q_learning = MultiAgent(q_table, headless=True, room=maps.generate(4, 3, hazards=0.2, seed=0))
+        agent1, agent2 = State(0, 2, shift=1), State(1, 2, shift=2)
+        q = q_learning.init_q(agent1.shift, agent2.shift)
+        cells = q_learning.WIDTH * q_learning.HEIGHT
+        # a few joint states get every write, so their rows are emptied by the removals
+        joint = [(rng.randrange(cells), rng.randrange(cells)) for _ in range(4)]
+        q.argmax()
+        for i in range(3000):
+            c1, c2 = rng.choice(joint)
+            action = rng.randrange(5)
+            if q.has_action(c1, c2, action):
+                if rng.random() < .05:
+                    q.remove_action(c1, c2, action)
+                else:
+                    q.write(c1, c2, action, rng.choice(VALUES))
+            if i % 50 == 0:
+                array = np.asarray(q.to_array())
+                np.testing.assert_array_equal(q.argmax(), np.argmax(array, axis=2))
+                for c1, c2 in joint:
+                    self.assertEqual(q.best_action(c1, c2), np.argmax(array[c1, c2]))
+                    if np.isfinite(array[c1, c2]).any():
+                        self.assertEqual(q.max_value(c1, c2), np.max(array[c1, c2]))
+
+    def test_dict(self):
+        self.check('dict')
+
+    def test_lazy(self):
+        self.check('lazy')
+
+    def test_tensor(self):
+        self.check('tensor')
+
+
+class FiveRoomsMaxTest(unittest.TestCase):
+
+    def test_set_q(self):
+        rng = random.Random(2)
+        q_learning = FiveRooms()
+        states = range(q_learning.MaxStateCount)
+        for _ in range(5000):
+            state = rng.choice(states)
+            q_learning.set_q(state, rng.choice(q_learning.allowed[state]), rng.choice(VALUES))
+            expected = [max([0] + [q_learning.Q[s][a] for a in q_learning.allowed[s]]) for s in states]
+            self.assertEqual(q_learning.max_q, expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
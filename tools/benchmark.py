@@ -0,0 +1,251 @@
+#!/usr/bin/env python
+"""
+    Reproducible benchmarks of the Q-learning programs (fixed seeds, headless).
+
+    $ python tools/benchmark.py -o bench.json
+    $ python tools/benchmark.py --compare bench.json         # fails on regressions
+    $ python tools/benchmark.py -k multi_agent --no-memory
+
+    Every case reports wall times, steps/sec where it trains and peak traced memory (tracemalloc, separate run).
+    Cases run --repeat times and keep the best time / rate of each metric.
+"""
+from __future__ import print_function
+import argparse
+import contextlib
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from common import maps
+from tools import programs
+
+SEED = 0
+# metrics where a bigger number is better, everything else is a cost
+HIGHER_IS_BETTER = ('steps_per_sec', 'rollouts_per_sec', 'cells_per_sec', 'transitions_per_sec')
+
+
+def timed(fn, *args, **kwargs):
+    start_time = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return time.perf_counter() - start_time, result
+
+
+def five_rooms_training():
+    q_learning, train = programs.build('five_rooms_problem', seed=SEED)
+    train_time, _ = timed(train)
+    return {'train_time': train_time, 'steps': q_learning.tick, 'steps_per_sec': q_learning.tick / train_time}
+
+
+def five_rooms_batch(n_envs, epochs=5000):
+    def case():
+        q_learning, _ = programs.build('five_rooms_problem', {'Epochs': epochs}, seed=SEED)
+        train_time, trainer = timed(q_learning.training_batch, n_envs, SEED)
+        return {'train_time': train_time, 'steps': trainer.steps, 'steps_per_sec': trainer.steps / train_time}
+    return case
+
+
+def single_agent_training(q_table):
+    def case():
+        programs.load('single_agent')
+        init_time, (q_learning, train) = timed(programs.build, 'single_agent', seed=SEED, q_table=q_table)
+        train_time, _ = timed(train)
+        return {'init_time': init_time, 'train_time': train_time, 'steps': q_learning.tick,
+                'steps_per_sec': q_learning.tick / train_time}
+    return case
+
+
+def single_agent_batch(n_envs):
+    def case():
+        q_learning, _ = programs.build('single_agent', seed=SEED, q_table='dense')
+        module = programs.load('single_agent')
+        trainer = module.BatchTrainer(q_learning, n_envs, seed=SEED)
+        train_time, _ = timed(trainer.training, module.State(0, 8))
+        return {'train_time': train_time, 'steps': trainer.steps, 'steps_per_sec': trainer.steps / train_time}
+    return case
+
+
+def single_agent_solve():
+    q_learning, _ = programs.build('single_agent', seed=SEED, q_table='dense')
+    solve_time, iterations = timed(q_learning.solve)
+    return {'solve_time': solve_time, 'iterations': iterations}
+
+
+def single_agent_scale(size, hazards=0.2):
+    def case():
+        room = maps.generate(size, size, hazards, seed=SEED)
+        init_time, (q_learning, _) = timed(programs.build, 'single_agent', seed=SEED, q_table='dense', room=room)
+        solve_time, iterations = timed(q_learning.solve)
+        return {'init_time': init_time, 'solve_time': solve_time, 'iterations': iterations,
+                'cells_per_sec': size * size * iterations / solve_time}
+    return case
+
+
+def single_agent_inference():
+    module = programs.load('single_agent')
+    q_learning, _ = programs.build('single_agent', seed=SEED, q_table='dict')
+    q_learning.solve()
+    start = module.State(0, 8)
+
+    def greedy_path():
+        state = start
+        while not q_learning.is_game_won(state):
+            state = q_learning.choose_next_action(state, False)
+
+    path_time, _ = timed(greedy_path)
+    compile_time, policy = timed(q_learning.compile_policy)
+    starts = np.arange(len(policy.actions))
+    rollout_time, _ = timed(policy.rollout, starts)
+    return {'q_path_time': path_time, 'compile_time': compile_time, 'rollout_time': rollout_time,
+            'rollouts_per_sec': len(starts) / rollout_time}
+
+
+def multi_agent_training(q_table, epochs=20):
+    def case():
+        module = programs.load('multi_agent')
+        programs.seed_all(SEED)
+        q_learning = module.QLearning(q_table, headless=True)
+        q_learning.EPOCHS = epochs
+        agent1 = module.State(1, 8, shift=1)
+        agent2 = module.State(0, 8, shift=2)
+        init_time, _ = timed(lambda: (q_learning.init_q(agent1.shift, agent2.shift),
+                                      q_learning.init_q(agent2.shift, agent1.shift)))
+        q_learning.q1 = q_learning.init_q(agent1.shift, agent2.shift)
+        q_learning.q2 = q_learning.init_q(agent2.shift, agent1.shift)
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            train_time, _ = timed(q_learning.training, agent1, agent2)
+        return {'init_time': init_time, 'train_time': train_time, 'steps': q_learning.tick,
+                'steps_per_sec': q_learning.tick / train_time, 'q_entries': len(q_learning.q1) + len(q_learning.q2)}
+    return case
+
+
+def multi_agent_inference(epochs=20):
+    q_learning, train = programs.build('multi_agent', {'EPOCHS': epochs}, seed=SEED, q_table='tensor')
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        train()
+    compile_time, policy = timed(q_learning.compile_policy, 1, 2)
+    cells = len(policy.next1)
+    c1, c2 = np.repeat(np.arange(cells), cells), np.tile(np.arange(cells), cells)
+    rollout_time, _ = timed(policy.rollout, c1, c2)
+    return {'compile_time': compile_time, 'rollout_time': rollout_time, 'rollouts_per_sec': len(c1) / rollout_time}
+
+
+def multi_agent_rewards(transitions=1000000):
+    q_learning, _ = programs.build('multi_agent', seed=SEED)
+    cells = q_learning.WIDTH * q_learning.HEIGHT
+    rng = np.random.default_rng(SEED)
+    act1, act2, st1, st2 = (rng.integers(0, cells, transitions) for _ in range(4))
+    batch_time, _ = timed(q_learning.get_batch_rewards, act1, act2, st1, st2)
+    return {'batch_time': batch_time, 'transitions_per_sec': transitions / batch_time}
+
+
+CASES = [
+    ('five_rooms_problem.training', five_rooms_training),
+    ('five_rooms_problem.training_batch[64]', five_rooms_batch(64)),
+    ('single_agent.training[dict]', single_agent_training('dict')),
+    ('single_agent.training[dense]', single_agent_training('dense')),
+    ('single_agent.training_batch[64]', single_agent_batch(64)),
+    ('single_agent.solve', single_agent_solve),
+    ('single_agent.inference', single_agent_inference),
+    ('single_agent.solve[200x200]', single_agent_scale(200)),
+    ('multi_agent.training[dict]', multi_agent_training('dict')),
+    ('multi_agent.training[tensor]', multi_agent_training('tensor')),
+    ('multi_agent.training[lazy]', multi_agent_training('lazy')),
+    ('multi_agent.inference', multi_agent_inference),
+    ('multi_agent.rewards_batch', multi_agent_rewards),
+]
+
+
+def peak_memory(fn):
+    tracemalloc.start()
+    try:
+        fn()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=ROOT,
+                                       stderr=subprocess.STDOUT).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def best_of(runs):
+    metrics = dict(runs[0])
+    for name in metrics:
+        values = [run[name] for run in runs]
+        if name in HIGHER_IS_BETTER:
+            metrics[name] = max(values)
+        elif name.endswith('_time'):
+            metrics[name] = min(values)
+    return metrics
+
+
+def run(cases, memory=True, repeat=3):
+    results = {}
+    for name, fn in cases:
+        metrics = best_of([fn() for _ in range(repeat)])
+        if memory:
+            metrics['peak_memory'] = peak_memory(fn)
+        results[name] = metrics
+        print("%-38s %s" % (name, '  '.join('%s=%.4g' % item for item in sorted(metrics.items()))))
+    return {'commit': git_commit(), 'python': platform.python_version(), 'numpy': np.__version__,
+            'seed': SEED, 'repeat': repeat, 'results': results}
+
+
+def compare(old, new, threshold=0.1):
+    """ Prints relative changes, returns the (case, metric) pairs that got worse by more than threshold """
+    regressions = []
+    for name, metrics in sorted(new['results'].items()):
+        for metric, value in sorted(metrics.items()):
+            before = old['results'].get(name, {}).get(metric)
+            if not before or not metric.endswith(('_time', '_per_sec', 'peak_memory')):
+                continue
+            change = (value - before) / float(before)
+            worse = -change if metric in HIGHER_IS_BETTER else change
+            flag = 'REGRESSION' if worse > threshold else ''
+            if flag:
+                regressions.append((name, metric))
+            print("%-38s %-18s %12.4g -> %-12.4g %+7.1f%% %s" % (name, metric, before, value, change * 100, flag))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('-k', dest='keyword', help='only run cases whose name contains this')
+    parser.add_argument('--repeat', type=int, default=3, help='runs per case, the best one is reported')
+    parser.add_argument('--no-memory', dest='memory', action='store_false', help='skip the tracemalloc runs')
+    parser.add_argument('-o', '--output', help='write results as JSON')
+    parser.add_argument('--compare', help='JSON results of an earlier run to compare against')
+    parser.add_argument('--threshold', type=float, default=0.1, help='relative slowdown counted as regression')
+    args = parser.parse_args(argv)
+
+    cases = [case for case in CASES if not args.keyword or args.keyword in case[0]]
+    report = run(cases, args.memory, args.repeat)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+
+    if args.compare:
+        with open(args.compare) as f:
+            old = json.load(f)
+        print("\nCompared with %s (%s)" % (args.compare, old.get('commit')))
+        if compare(old, report, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
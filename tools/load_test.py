@@ -0,0 +1,120 @@
+#!/usr/bin/env python
+"""
+    Load test of tools/serve.py: concurrent clients send act / path requests with random states
+    and the latency percentiles of each op are reported.
+
+    $ python tools/load_test.py --clients 32 --requests 500 --batch 16
+    $ python tools/load_test.py --op path --starts 64 -o latency.json
+
+    --starts limits path queries to that many distinct start states, so it sets the cache hit rate.
+"""
+from __future__ import print_function
+import argparse
+import asyncio
+import json
+import random
+import time
+
+import numpy as np
+
+PERCENTILES = (50, 90, 99, 99.9)
+
+
+async def request(reader, writer, message):
+    writer.write(json.dumps(message).encode('utf-8') + b'\n')
+    await writer.drain()
+    response = json.loads(await reader.readline())
+    if 'error' in response:
+        raise RuntimeError(response['error'])
+    return response
+
+
+def random_states(rng, info, count, starts=None):
+    cells = info['cells']
+    if starts is not None:
+        return [rng.choice(starts) for _ in range(count)]
+    if info['program'] == 'multi_agent':
+        return [[rng.randrange(cells), rng.randrange(cells)] for _ in range(count)]
+    return [rng.randrange(cells) for _ in range(count)]
+
+
+async def client(args, info, starts, seed, latencies):
+    rng = random.Random(seed)
+    reader, writer = await asyncio.open_connection(args.host, args.port, limit=2 ** 24)
+    ops = ('act', 'path') if args.op == 'mixed' else (args.op,)
+    try:
+        for i in range(args.requests):
+            op = ops[i % len(ops)]
+            if op == 'act':
+                message = {'op': 'act', 'states': random_states(rng, info, args.batch)}
+            else:
+                message = {'op': 'path', 'starts': random_states(rng, info, args.batch, starts)}
+            message['id'] = i
+            started = time.perf_counter()
+            await request(reader, writer, message)
+            latencies[op].append(time.perf_counter() - started)
+    finally:
+        writer.close()
+
+
+async def load_test(args):
+    reader, writer = await asyncio.open_connection(args.host, args.port)
+    info = await request(reader, writer, {'op': 'info'})
+    writer.close()
+
+    rng = random.Random(args.seed)
+    starts = random_states(rng, info, args.starts) if args.starts else None
+    latencies = {'act': [], 'path': []}
+    started = time.perf_counter()
+    await asyncio.gather(*[client(args, info, starts, args.seed + 1 + i, latencies) for i in range(args.clients)])
+    wall = time.perf_counter() - started
+
+    reader, writer = await asyncio.open_connection(args.host, args.port)
+    stats = await request(reader, writer, {'op': 'stats'})
+    writer.close()
+    return info, latencies, wall, stats
+
+
+def summarize(latencies, wall, batch):
+    results = {}
+    for op, values in latencies.items():
+        if not values:
+            continue
+        ms = np.array(values) * 1e3
+        results[op] = dict({'p%g' % p: float(v) for p, v in zip(PERCENTILES, np.percentile(ms, PERCENTILES))},
+                           requests=len(ms), mean=float(ms.mean()), max=float(ms.max()),
+                           requests_per_sec=len(ms) / wall, states_per_sec=len(ms) * batch / wall)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--clients', type=int, default=16, help='concurrent connections')
+    parser.add_argument('--requests', type=int, default=200, help='requests per client')
+    parser.add_argument('--batch', type=int, default=8, help='states per request')
+    parser.add_argument('--op', choices=('act', 'path', 'mixed'), default='mixed')
+    parser.add_argument('--starts', type=int, help='distinct start states of path queries')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('-o', '--output', help='write results as JSON')
+    args = parser.parse_args(argv)
+
+    info, latencies, wall, stats = asyncio.run(load_test(args))
+    results = summarize(latencies, wall, args.batch)
+
+    print("%s, %d clients x %d requests of %d states in %.2fs" %
+          (info['program'], args.clients, args.requests, args.batch, wall))
+    print("%-6s %8s %10s %9s %9s %9s %9s %9s" % ('op', 'requests', 'req/sec', 'mean ms', 'p50', 'p90', 'p99', 'max'))
+    for op, r in sorted(results.items()):
+        print("%-6s %8d %10.0f %9.3f %9.3f %9.3f %9.3f %9.3f" %
+              (op, r['requests'], r['requests_per_sec'], r['mean'], r['p50'], r['p90'], r['p99'], r['max']))
+    print("path cache: %d hits, %d misses" % (stats['hits'], stats['misses']))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'info': info, 'wall': wall, 'results': results, 'server': stats}, f, indent=2, sort_keys=True)
+
+
+if __name__ == '__main__':
+    main()
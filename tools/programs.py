@@ -0,0 +1,82 @@
+"""
+    One entry point per Q-learning program: build a QLearning, apply parameters, seed and train it.
+"""
+import importlib
+import os
+import random
+import sys
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+PROGRAMS = ('five_rooms_problem', 'single_agent', 'multi_agent')
+
+
+def load(program):
+    if program not in PROGRAMS:
+        raise ValueError("Unknown program: %s (expected one of %s)" % (program, ', '.join(PROGRAMS)))
+    return importlib.import_module(program + '.main')
+
+
+def seed_all(seed):
+    random.seed(seed)
+    np.random.seed(seed)
+
+
+def apply_params(q_learning, params):
+    for name, value in params.items():
+        if not hasattr(q_learning, name):
+            raise ValueError("%s has no parameter %s" % (type(q_learning).__module__, name))
+        setattr(q_learning, name, value)
+
+
+def build(program, params=None, seed=None, **kwargs):
+    """ Returns (q_learning, train) where train() runs one full training """
+    module = load(program)
+    if seed is not None:
+        seed_all(seed)
+    if program != 'five_rooms_problem':
+        kwargs.setdefault('headless', True)
+    q_learning = module.QLearning(**kwargs)
+    apply_params(q_learning, params or {})
+
+    if program == 'five_rooms_problem':
+        def train():
+            q_learning.training()
+    elif program == 'single_agent':
+        if 'INIT_Q_VALUE' in (params or {}):
+            q_learning.init_q()
+
+        def train():
+            q_learning.training(module.State(0, q_learning.HEIGHT - 1))
+    else:
+        agent1 = module.State(1, q_learning.HEIGHT - 1, shift=1)
+        agent2 = module.State(0, q_learning.HEIGHT - 1, shift=2)
+        q_learning.q1 = q_learning.init_q(agent1.shift, agent2.shift)
+        q_learning.q2 = q_learning.init_q(agent2.shift, agent1.shift)
+
+        def train():
+            q_learning.training(agent1, agent2)
+
+    return q_learning, train
+
+
+def summary(q_learning):
+    return {
+        'steps': q_learning.tick,
+        'success': getattr(q_learning, 'success', getattr(q_learning, 'Epochs', 0)),
+        'failures': getattr(q_learning, 'failures', 0),
+    }
+
+
+def train(program, params=None, seed=None, **kwargs):
+    q_learning, run_training = build(program, params, seed, **kwargs)
+    start_time = time.time()
+    run_training()
+    result = summary(q_learning)
+    result['wall_time'] = time.time() - start_time
+    return q_learning, result
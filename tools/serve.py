@@ -0,0 +1,212 @@
+#!/usr/bin/env python
+"""
+    Serves a trained policy to many clients over TCP with asyncio. The policy is loaded once.
+
+    $ python tools/serve.py policy.npz                   # saved with q_learning.compile_policy(...).save(path)
+    $ python tools/serve.py checkpoint.npy --room map.txt --port 8765
+
+    One JSON object per line in each direction, answers carry the request's "id":
+    {"op": "info"}                                   program, grid size, actions
+    {"op": "act", "states": [c, ...]}                greedy actions of many states
+    {"op": "path", "starts": [c, ...]}               full paths from many start states
+    {"op": "stats"}                                  requests served, path cache hits / misses
+    A state is a cell y * WIDTH + x, for multi_agent a pair [agent 1 cell, agent 2 cell].
+    Paths are cached per start state (LRU).
+"""
+from __future__ import print_function
+import argparse
+import asyncio
+import collections
+import json
+import os
+import sys
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from common import checkpoint, maps
+from single_agent.q_table import ACTIONS as SINGLE_ACTIONS
+from multi_agent.q_table import ACTIONS as MULTI_ACTIONS
+
+
+class LRUCache:
+    def __init__(self, maxsize=4096):
+        self.maxsize = maxsize
+        self.items = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, compute):
+        try:
+            value = self.items.pop(key)
+            self.hits += 1
+        except KeyError:
+            value = compute()
+            self.misses += 1
+            if len(self.items) >= self.maxsize:
+                self.items.popitem(last=False)
+        self.items[key] = value
+        return value
+
+
+class SingleAgentService:
+    program = 'single_agent'
+    actions = SINGLE_ACTIONS
+
+    def __init__(self, policy):
+        self.policy = policy
+        self.cells = len(policy.actions)
+
+    def act(self, states):
+        return self.policy.actions[self.cells_of(states)].tolist()
+
+    def path(self, start):
+        path, won = self.policy.path(start)
+        return {'path': path, 'won': won}
+
+    def key(self, start):
+        return int(self.cells_of([start])[0])
+
+    def cells_of(self, states):
+        cells = np.asarray(states, dtype=np.int64).reshape(-1)
+        if len(cells) and (cells.min() < 0 or cells.max() >= self.cells):
+            raise ValueError("cells are 0 .. %d" % (self.cells - 1))
+        return cells
+
+
+class MultiAgentService:
+    program = 'multi_agent'
+    actions = MULTI_ACTIONS
+
+    def __init__(self, policy):
+        self.policy = policy
+        self.cells = len(policy.next1)
+
+    def act(self, states):
+        c1, c2 = self.cells_of(states)
+        return np.stack((self.policy.actions1[c1, c2], self.policy.actions2[c2, c1]), axis=1).tolist()
+
+    def path(self, start):
+        path, won = self.policy.path(*start)
+        return {'path': [list(cells) for cells in path], 'won': bool(won)}
+
+    def key(self, start):
+        c1, c2 = self.cells_of([start])
+        return int(c1[0]), int(c2[0])
+
+    def cells_of(self, states):
+        cells = np.asarray(states, dtype=np.int64).reshape(-1, 2)
+        if len(cells) and (cells.min() < 0 or cells.max() >= self.cells):
+            raise ValueError("cells are 0 .. %d" % (self.cells - 1))
+        return cells[:, 0], cells[:, 1]
+
+
+def load_service(path, room=None):
+    """ A service for a compiled policy (.npz) or a Q checkpoint (.npy / .json) """
+    if path.endswith('.npz'):
+        with np.load(path) as data:
+            multi = 'actions1' in data.files
+        if multi:
+            from multi_agent.policy import Policy
+            return MultiAgentService(Policy.load(path))
+        from single_agent.policy import Policy
+        return SingleAgentService(Policy.load(path))
+
+    _, header = checkpoint.load(path, mmap=True)
+    room = maps.load(room) if room else None
+    if header.get('program') == 'multi_agent':
+        from multi_agent.main import QLearning
+        q_learning = QLearning(q_table='tensor', headless=True, room=room)
+        shift1, shift2 = q_learning.load(path)
+        return MultiAgentService(q_learning.compile_policy(shift1, shift2))
+    if header.get('program') == 'single_agent':
+        from single_agent.main import QLearning
+        q_learning = QLearning(q_table='dense', headless=True, room=room)
+        q_learning.load(path)
+        return SingleAgentService(q_learning.compile_policy())
+    raise ValueError("%s: cannot serve a %s checkpoint" % (path, header.get('program')))
+
+
+class PolicyServer:
+    def __init__(self, service, cache_size=4096):
+        self.service = service
+        self.cache = LRUCache(cache_size)
+        self.requests = 0
+        self.connections = 0
+
+    def handle(self, request):
+        op = request.get('op')
+        service = self.service
+        if op == 'act':
+            return {'actions': service.act(request['states'])}
+        if op == 'path':
+            paths = []
+            for start in request['starts']:
+                key = service.key(start)
+                paths.append(self.cache.get(key, lambda: service.path(key)))
+            return {'paths': paths}
+        if op == 'info':
+            return {'program': service.program, 'cells': service.cells, 'WIDTH': int(service.policy.WIDTH),
+                    'actions': list(service.actions)}
+        if op == 'stats':
+            return {'requests': self.requests, 'connections': self.connections, 'cached_paths': len(self.cache.items),
+                    'hits': self.cache.hits, 'misses': self.cache.misses}
+        raise ValueError("unknown op %r" % op)
+
+    def respond(self, line):
+        request = {}
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict):
+                request = {}
+                raise ValueError("expected a JSON object")
+            response = self.handle(request)
+        except (ValueError, KeyError, TypeError, IndexError) as e:
+            response = {'error': '%s: %s' % (type(e).__name__, e)}
+        self.requests += 1
+        if 'id' in request:
+            response['id'] = request['id']
+        return json.dumps(response).encode('utf-8') + b'\n'
+
+    async def client(self, reader, writer):
+        self.connections += 1
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                writer.write(self.respond(line))
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host='127.0.0.1', port=8765):
+        server = await asyncio.start_server(self.client, host, port, limit=2 ** 24)
+        print("Serving %s on %s:%d" % (self.service.program, host, port))
+        async with server:
+            await server.serve_forever()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('path', help='compiled policy (.npz) or Q checkpoint (.npy / .json)')
+    parser.add_argument('--room', help='map file the checkpoint was trained on')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--cache', type=int, default=4096, help='cached paths (start states)')
+    args = parser.parse_args(argv)
+
+    server = PolicyServer(load_service(args.path, args.room), args.cache)
+    try:
+        asyncio.run(server.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,140 @@
+#!/usr/bin/env python
+"""
+    Hyperparameter sweep over QLearning configurations on a process pool.
+
+    $ python tools/sweep.py single_agent GAMMA=0.7,0.8,0.9 EPSILON=0.1,0.2 --repeat 3
+    $ python tools/sweep.py multi_agent GAMMA=0.8:0.99 WALK_REWARDS=-0.3:0 --samples 32 -o sweep.csv
+
+    A comma list is a grid axis, lo:hi is a uniform range for random search.
+"""
+from __future__ import print_function
+import argparse
+import contextlib
+import csv
+import itertools
+import multiprocessing
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from tools import programs
+
+
+def parse_value(value):
+    try:
+        return int(value)
+    except ValueError:
+        return float(value)
+
+
+def parse_param(text):
+    name, _, values = text.partition('=')
+    if not values:
+        raise argparse.ArgumentTypeError("expected NAME=v1,v2,... or NAME=lo:hi, got %r" % text)
+    if ':' in values:
+        lo, hi = values.split(':')
+        return name, (parse_value(lo), parse_value(hi))
+    return name, [parse_value(v) for v in values.split(',')]
+
+
+def grid(params):
+    names = sorted(params)
+    for name in names:
+        if isinstance(params[name], tuple):
+            raise ValueError("%s is a range, grid search needs a list of values" % name)
+    for values in itertools.product(*[params[name] for name in names]):
+        yield dict(zip(names, values))
+
+
+def random_configs(params, samples, seed=0):
+    rng = random.Random(seed)
+    for _ in range(samples):
+        config = {}
+        for name in sorted(params):
+            values = params[name]
+            if isinstance(values, tuple):
+                config[name] = rng.uniform(*values)
+            else:
+                config[name] = rng.choice(values)
+        yield config
+
+
+def make_runs(program, configs, repeat=1, seed=0, **kwargs):
+    runs = []
+    for config in configs:
+        for _ in range(repeat):
+            runs.append({'run': len(runs), 'program': program, 'params': config,
+                         'seed': seed + len(runs), 'kwargs': kwargs})
+    return runs
+
+
+def run_one(run):
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        _, result = programs.train(run['program'], run['params'], run['seed'], **run['kwargs'])
+    row = {'run': run['run'], 'seed': run['seed']}
+    row.update(run['params'])
+    row.update(result)
+    return row
+
+
+def sweep(runs, processes=None):
+    pool = multiprocessing.Pool(processes)
+    try:
+        rows = list(pool.imap_unordered(run_one, runs))
+    finally:
+        pool.close()
+        pool.join()
+    return sorted(rows, key=lambda row: row['run'])
+
+
+def print_table(rows):
+    if not rows:
+        return
+    columns = list(rows[0])
+    print(''.join('%14s' % c for c in columns))
+    for row in rows:
+        print(''.join('%14.4g' % row[c] if isinstance(row[c], float) else '%14s' % row[c] for c in columns))
+
+
+def write_csv(rows, path):
+    with open(path, 'w') as f:
+        writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('program', choices=programs.PROGRAMS)
+    parser.add_argument('params', nargs='*', type=parse_param)
+    parser.add_argument('--samples', type=int, help='random search with this many configurations')
+    parser.add_argument('--repeat', type=int, default=1, help='runs per configuration')
+    parser.add_argument('--seed', type=int, default=0, help='base seed, run i uses seed + i')
+    parser.add_argument('--processes', type=int, help='pool size, defaults to the number of cores')
+    parser.add_argument('--q-table', help='Q table backend for single_agent / multi_agent')
+    parser.add_argument('-o', '--output', help='write results as CSV')
+    args = parser.parse_args(argv)
+
+    params = dict(args.params)
+    if args.samples:
+        configs = random_configs(params, args.samples, args.seed)
+    else:
+        configs = grid(params)
+    kwargs = {'q_table': args.q_table} if args.q_table else {}
+    runs = make_runs(args.program, configs, args.repeat, args.seed, **kwargs)
+
+    start_time = time.time()
+    rows = sweep(runs, args.processes)
+    print_table(rows)
+    print("\n%d runs in %.2f seconds" % (len(rows), time.time() - start_time))
+    if args.output:
+        write_csv(rows, args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+#!/usr/bin/env python
+"""
+    Inspects a trajectory log written by QLearning.record(path).
+
+    $ python tools/trajectory.py run.qtr                  # summary
+    $ python tools/trajectory.py run.qtr --episode 12     # every step of one episode
+    $ python tools/trajectory.py run.qtr --last 20        # the last 20 records
+"""
+from __future__ import print_function
+import argparse
+import json
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from common.trajectory import TrajectoryReader
+
+
+def describe_state(header, state):
+    """ Cells as (x, y), joint states as both agents' cells """
+    if 'WIDTH' not in header:
+        return '%d' % state
+    width = header['WIDTH']
+    cells = width * header['HEIGHT']
+    if header['program'] == 'multi_agent':
+        own, partner = divmod(int(state), cells)
+        return '(%d, %d) / (%d, %d)' % (own % width, own // width, partner % width, partner // width)
+    return '(%d, %d)' % (state % width, state // width)
+
+
+def describe_action(header, action):
+    actions = header.get('actions')
+    return actions[action] if actions else '%d' % action
+
+
+def show(reader, records):
+    header = reader.header
+    print("%8s %6s %5s %-22s %-8s %9s %10s" % ('episode', 'step', 'agent', 'state', 'action', 'reward', 'Q'))
+    for record in records:
+        print("%8d %6d %5d %-22s %-8s %9.2f %10.4f" % (
+            record['episode'], record['step'], record['agent'], describe_state(header, record['state']),
+            describe_action(header, record['action']), record['reward'], record['q']))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('path')
+    parser.add_argument('--episode', type=int, help='show every step of this episode')
+    parser.add_argument('--agent', type=int, help='only this agent (multi_agent)')
+    parser.add_argument('--last', type=int, help='show the last N records')
+    args = parser.parse_args(argv)
+
+    reader = TrajectoryReader(args.path)
+    if args.episode is not None:
+        show(reader, reader.episode(args.episode, args.agent))
+    elif args.last:
+        show(reader, reader.records[-args.last:])
+    else:
+        print(json.dumps(dict(reader.summary(), program=reader.header.get('program')), indent=2, sort_keys=True))
+
+
+if __name__ == '__main__':
+    main()